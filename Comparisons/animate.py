@@ -0,0 +1,329 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+
+from composite_engine import (
+    bounded_map,
+    cached_font,
+    label_sprite,
+    label_color,
+    load_font,
+    paste_label,
+    print_summary,
+    stroke_color,
+    stroke_width,
+    text_padding,
+)
+
+# Default clip budget
+fps = 24
+duration = 3.0  # Seconds per clip
+max_size = (1280, 720)  # Frames are fit within this
+flicker_hold = 0.5  # Seconds each input is shown in flicker mode
+divider_width = 2
+divider_color = (255, 255, 255)
+
+# ffmpeg output settings per container
+output_formats = {
+    "mp4": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"],
+    "webm": ["-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "32", "-deadline", "realtime"],
+}
+
+
+def frame_size(sizes, limit=max_size):
+    """
+    Common frame size: the largest input, fit within limit, rounded down to even
+    dimensions (yuv420p needs them).
+    """
+    width, height = max(sizes, key=lambda s: s[0] * s[1])
+    scale = min(1.0, limit[0] / width, limit[1] / height)
+    width, height = int(width * scale), int(height * scale)
+    return max(2, width - width % 2), max(2, height - height % 2)
+
+
+def load_frames(paths, size):
+    """
+    Decodes every input at the frame size (JPEGs straight at a reduced scale) and
+    returns them as uint8 RGB arrays.
+    """
+    frames = []
+    for path in paths:
+        with Image.open(path) as img:
+            img.draft("RGB", size)
+            img = img.convert("RGB")
+            if img.size != size:
+                img = img.resize(size, Image.Resampling.LANCZOS)
+        frames.append(np.asarray(img))
+        img.close()
+    return frames
+
+
+def stamp_label(frame, label, font, right=False):
+    """Copy of frame with label in its top-left (or top-right) corner."""
+    img = Image.fromarray(frame)
+    position = (text_padding, text_padding)
+    if right:
+        sprite, _ = label_sprite(label, font, label_color, stroke_color, stroke_width)
+        position = (img.width - sprite.width - text_padding, text_padding)
+    paste_label(img, position, label, font)
+    return np.asarray(img)
+
+
+def wipe_frames(frames, labels, font, count):
+    """
+    Yields count frames of a divider sweeping across each consecutive pair of
+    inputs and back: the earlier input on the left (labelled top-left), the later
+    one on the right (labelled top-right).
+    """
+    width = frames[0].shape[1]
+    segments = len(frames) - 1
+    out = np.empty_like(frames[0])
+    current = None
+    for i in range(count):
+        t = i * segments / max(1, count - 1)
+        segment = min(int(t), segments - 1)
+        if segment != current:
+            current = segment
+            left = stamp_label(frames[segment], labels[segment], font)
+            right = stamp_label(
+                frames[segment + 1], labels[segment + 1], font, right=True
+            )
+        # Ping-pong within the segment: right to left, then back
+        phase = t - segment
+        position = int(width * (1 - abs(1 - 2 * phase)))
+        out[:, :position] = left[:, :position]
+        out[:, position:] = right[:, position:]
+        lo = max(0, min(position, width - divider_width))
+        out[:, lo : lo + divider_width] = divider_color
+        yield out
+
+
+def flicker_frames(frames, count):
+    """Yields count frames cycling through the inputs, one frame per hold."""
+    for i in range(count):
+        yield frames[i % len(frames)]
+
+
+def ffmpeg_command(ffmpeg, size, rate, output_path, output_fps):
+    """ffmpeg reading raw rgb24 frames of size at rate from stdin."""
+    container = os.path.splitext(output_path)[1].lstrip(".")
+    return (
+        [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24"]
+        + ["-s", f"{size[0]}x{size[1]}", "-framerate", f"{rate:g}", "-i", "-"]
+        + output_formats[container]
+        + ["-pix_fmt", "yuv420p", "-r", f"{output_fps:g}", output_path]
+    )
+
+
+def animate_file(
+    filename,
+    input_dirs,
+    labels,
+    output_dir,
+    font,
+    mode="wipe",
+    fps=fps,
+    duration=duration,
+    size_limit=max_size,
+    hold=flicker_hold,
+    container="mp4",
+    ffmpeg="ffmpeg",
+):
+    """
+    Renders the wipe or flicker clip for one filename present in every input dir,
+    piping frames straight into ffmpeg. Returns a result dict like composite_file.
+    """
+    result = {"name": filename, "status": "created", "error": None}
+    paths = [os.path.join(d, filename) for d in input_dirs]
+    missing = [label for p, label in zip(paths, labels) if not os.path.exists(p)]
+    if missing:
+        result["status"] = "skipped"
+        result["error"] = f"Corresponding {', '.join(missing)} file not found"
+        return result
+
+    output_path = os.path.join(
+        output_dir, f"{os.path.splitext(filename)[0]}.{container}"
+    )
+    try:
+        sizes = []
+        for p in paths:
+            with Image.open(p) as img:
+                sizes.append(img.size)
+        size = frame_size(sizes, size_limit)
+        frames = load_frames(paths, size)
+        if mode == "wipe":
+            rate = fps
+            count = max(2, round(fps * duration))
+            source = wipe_frames(frames, labels, font, count)
+        else:
+            frames = [stamp_label(f, label, font) for f, label in zip(frames, labels)]
+            # Each hold is a single input frame; ffmpeg repeats it up to fps
+            rate = 1 / hold
+            count = max(len(frames), round(duration / hold))
+            source = flicker_frames(frames, count)
+
+        process = subprocess.Popen(
+            ffmpeg_command(ffmpeg, size, rate, output_path, fps),
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        # Drain stderr alongside the writes so a chatty ffmpeg can't fill the
+        # pipe and stall while we block on stdin
+        errors = []
+        reader = threading.Thread(
+            target=lambda: errors.append(process.stderr.read()), daemon=True
+        )
+        reader.start()
+        try:
+            for frame in source:
+                process.stdin.write(frame.data)
+        except BrokenPipeError:
+            pass  # ffmpeg exited early; its stderr says why
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            process.wait()
+            reader.join()
+        stderr = b"".join(errors).decode(errors="replace").strip()
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {stderr or process.returncode}")
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+def _animate_worker(job):
+    filename, input_dirs, labels, output_dir, font_spec, options = job
+    return animate_file(
+        filename, input_dirs, labels, output_dir, cached_font(*font_spec), **options
+    )
+
+
+def run(
+    input_dirs,
+    labels,
+    output_dir,
+    font_path="arial.ttf",
+    font_size=15,
+    workers=1,
+    max_in_flight=None,
+    **options,
+):
+    """
+    Renders a clip for every file in the first input directory that exists in all
+    the others. options are passed to animate_file (mode, fps, duration,
+    size_limit, hold, container, ffmpeg). Returns the per-file results.
+    """
+    if len(input_dirs) != len(labels) or len(input_dirs) < 2:
+        raise ValueError("Need at least two input directories, one label each.")
+    ffmpeg = options.get("ffmpeg", "ffmpeg")
+    if shutil.which(ffmpeg) is None:
+        raise FileNotFoundError(
+            f"ffmpeg not found ('{ffmpeg}'). Install it or pass --ffmpeg."
+        )
+    font = load_font(font_path, font_size)
+    os.makedirs(output_dir, exist_ok=True)
+
+    filenames = sorted(os.listdir(input_dirs[0]))
+    start = time.perf_counter()
+    if workers > 1:
+        if max_in_flight is None:
+            max_in_flight = workers * 2
+        jobs = (
+            (f, input_dirs, labels, output_dir, (font_path, font_size), options)
+            for f in filenames
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                bounded_map(executor, _animate_worker, jobs, max(1, max_in_flight))
+            )
+    else:
+        results = [
+            animate_file(f, input_dirs, labels, output_dir, font, **options)
+            for f in filenames
+        ]
+
+    print_summary(results, time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render wipe or flicker comparison clips by piping frames to ffmpeg."
+    )
+    parser.add_argument(
+        "--dirs", nargs="+", required=True, help="Input directories, in order."
+    )
+    parser.add_argument(
+        "--labels", nargs="+", required=True, help="One label per input directory."
+    )
+    parser.add_argument("--output", required=True, help="Output directory.")
+    parser.add_argument("--mode", choices=["wipe", "flicker"], default="wipe")
+    parser.add_argument("--fps", type=float, default=fps)
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=duration,
+        help=f"Seconds per clip (default: {duration:g}).",
+    )
+    parser.add_argument(
+        "--hold",
+        type=float,
+        default=flicker_hold,
+        help=f"Seconds per input in flicker mode (default: {flicker_hold:g}).",
+    )
+    parser.add_argument(
+        "--max-size",
+        default=f"{max_size[0]}x{max_size[1]}",
+        help=f"Fit frames within WxH (default: {max_size[0]}x{max_size[1]}).",
+    )
+    parser.add_argument("--format", choices=list(output_formats), default="mp4")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg executable.")
+    parser.add_argument("--font", default="arial.ttf", help="TrueType font path.")
+    parser.add_argument("--font-size", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        limit = tuple(int(v) for v in args.max_size.lower().split("x"))
+    except ValueError:
+        parser.error(f"--max-size must be WxH, got '{args.max_size}'")
+
+    try:
+        run(
+            args.dirs,
+            args.labels,
+            args.output,
+            font_path=args.font,
+            font_size=args.font_size,
+            workers=args.workers,
+            max_in_flight=args.max_in_flight,
+            mode=args.mode,
+            fps=args.fps,
+            duration=args.duration,
+            size_limit=limit,
+            hold=args.hold,
+            container=args.format,
+            ffmpeg=args.ffmpeg,
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
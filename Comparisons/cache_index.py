@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+
+# Default index file name, written inside the output directory
+index_name = ".composite_index.jsonl"
+
+
+def font_fingerprint(font):
+    """Identifies a loaded font: its file (with size and mtime) and point size."""
+    path = getattr(font, "path", None)
+    if not isinstance(path, str):
+        # PIL's built-in default font is loaded from memory
+        path = f"<{type(font).__name__}>"
+    fingerprint = {"path": path, "size": getattr(font, "size", None)}
+    if os.path.exists(path):
+        stat = os.stat(path)
+        fingerprint["file_size"] = stat.st_size
+        fingerprint["mtime_ns"] = stat.st_mtime_ns
+    return fingerprint
+
+
+def cache_key(paths, params):
+    """
+    SHA-256 over the input files' sizes and mtimes plus params (layout, labels,
+    font), so any change to the inputs or to how they are drawn gives a new key.
+    """
+    inputs = []
+    for path in paths:
+        stat = os.stat(path)
+        inputs.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    payload = json.dumps({"inputs": inputs, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheIndex:
+    """
+    Sidecar index of the cache key each output was last written with, so reruns
+    skip outputs whose inputs and parameters are unchanged.
+
+    The index is a JSON Lines file of {"output", "key"} entries, appended and
+    flushed as each output is written so an interrupted run keeps its progress. On
+    open it is compacted to the latest entry per output.
+    """
+
+    def __init__(self, output_dir, name=index_name):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, name)
+        self.keys = {}
+        self._load()
+        self._compact()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.keys[entry["output"]] = entry["key"]
+                except (ValueError, KeyError, TypeError):
+                    # A crash mid-write can leave a truncated last line
+                    continue
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for output, key in self.keys.items():
+                f.write(json.dumps({"output": output, "key": key}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, output_name, key):
+        """True if output_name was written with key and still exists."""
+        return self.keys.get(output_name) == key and os.path.exists(
+            os.path.join(self.output_dir, output_name)
+        )
+
+    def record(self, output_name, key):
+        """Stores the key output_name was just written with."""
+        self.keys[output_name] = key
+        self._file.write(json.dumps({"output": output_name, "key": key}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,447 @@
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+from cache_index import CacheIndex, cache_key, font_fingerprint
+from profiler import Profiler, null_profiler
+
+# Default text labels style
+label_color = (255, 255, 255)  # White
+stroke_color = (0, 0, 0)  # Black
+stroke_width = 1
+font_size = 15
+line_width = 1
+text_padding = 5  # Padding from the top and left edges of each strip
+
+
+def load_font(font_path="arial.ttf", size=font_size, verbose=True):
+    """Try to load a font, use default if not found."""
+    try:
+        return ImageFont.truetype(font_path, size)
+    except IOError:
+        if verbose:
+            print(f"Warning: {font_path} not found. Using default PIL font.")
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=None)
+def cached_font(font_path, size):
+    # Fonts are loaded once per worker process; the main process already warned
+    return load_font(font_path, size, verbose=False)
+
+
+@lru_cache(maxsize=64)
+def label_sprite(text, font, text_color, stroke_color, stroke_width):
+    """
+    Renders text with its stroke once into an RGBA sprite and returns
+    (sprite, (dx, dy)), where (dx, dy) is where the text origin sits in the sprite.
+
+    The stroke mask gets the text drawn at every offset within stroke_width, the
+    same (2 * stroke_width + 1)^2 - 1 draws the per-image version did, so the
+    accumulated coverage matches; the text is then alpha-composited on top.
+    """
+    left, top, right, bottom = font.getbbox(text)
+    dx = stroke_width - min(0, left)
+    dy = stroke_width - min(0, top)
+    size = (max(0, right) + dx + stroke_width, max(0, bottom) + dy + stroke_width)
+
+    stroke_mask = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(stroke_mask)
+    for ox in range(-stroke_width, stroke_width + 1):
+        for oy in range(-stroke_width, stroke_width + 1):
+            if ox != 0 or oy != 0:
+                draw.text((dx + ox, dy + oy), text, fill=255, font=font)
+    text_mask = Image.new("L", size, 0)
+    ImageDraw.Draw(text_mask).text((dx, dy), text, fill=255, font=font)
+
+    sprite = Image.new("RGBA", size, stroke_color + (0,))
+    sprite.putalpha(stroke_mask)
+    text_layer = Image.new("RGBA", size, text_color + (0,))
+    text_layer.putalpha(text_mask)
+    return Image.alpha_composite(sprite, text_layer), (dx, dy)
+
+
+def paste_label(img, position, text, font):
+    """Pastes the cached label sprite so the text origin lands on position."""
+    sprite, (dx, dy) = label_sprite(text, font, label_color, stroke_color, stroke_width)
+    img.paste(sprite, (position[0] - dx, position[1] - dy), sprite)
+
+
+def strip_box(resized_width, strip_width, index, count):
+    """
+    Left/right edges of strip index out of count, in resized coordinates: the first
+    strip is taken from the left, the last from the right, the rest from their own
+    slot in between.
+    """
+    if index == count - 1 and count > 1:
+        left = resized_width - strip_width
+    else:
+        left = index * strip_width
+    return left, left + strip_width
+
+
+def extract_strip(img, target_height, index, count):
+    """
+    Returns strip index of count from img as it would look resized to target_height.
+
+    Only the strip's source region is resampled (Pillow's resize box), instead of
+    resizing the whole image and then cropping, so each input costs 1/count of a
+    full resize.
+    """
+    width, height = img.size
+    if height == target_height:
+        resized_width = width
+    else:
+        resized_width = int(target_height * (width / height))
+    strip_width = resized_width // count
+    left, right = strip_box(resized_width, strip_width, index, count)
+    if height == target_height:
+        return img.crop((left, 0, right, target_height))
+    scale = width / resized_width
+    return img.resize(
+        (strip_width, target_height),
+        Image.Resampling.LANCZOS,
+        box=(left * scale, 0, right * scale, height),
+    )
+
+
+def make_composite(images, labels, font, target_height=None, profiler=null_profiler):
+    """
+    Builds a composite of one vertical strip per image, separated by black and
+    white lines and labelled in the top left of each strip. Strips are taken from
+    images resized to target_height (default: the first image's height).
+    """
+    if target_height is None:
+        target_height = images[0].height
+    with profiler.stage("resize"):
+        strips = [
+            extract_strip(img, target_height, i, len(images))
+            for i, img in enumerate(images)
+        ]
+
+    with profiler.stage("assemble"):
+        composite_img, offsets = _assemble(strips, target_height)
+
+    # Add text labels with stroke
+    with profiler.stage("labels"):
+        for label, offset in zip(labels, offsets):
+            paste_label(
+                composite_img, (offset + text_padding, text_padding), label, font
+            )
+    return composite_img
+
+
+def _assemble(strips, target_height):
+    """Pastes the strips side by side with separator lines; returns the offsets."""
+    # Calculate composite dimensions (sum of strip widths + line widths)
+    separator_width = line_width + line_width
+    composite_width = sum(strip.width for strip in strips) + separator_width * (
+        len(strips) - 1
+    )
+    # Create new composite image (using white background)
+    composite_img = Image.new("RGB", (composite_width, target_height), (255, 255, 255))
+    black_line = Image.new("RGB", (line_width, target_height), (0, 0, 0))
+    white_line = Image.new("RGB", (line_width, target_height), (255, 255, 255))
+
+    # Paste strips with a black and a white line in between
+    offsets = []
+    x = 0
+    for i, strip in enumerate(strips):
+        if i > 0:
+            composite_img.paste(black_line, (x, 0))
+            composite_img.paste(white_line, (x + line_width, 0))
+            x += separator_width
+        composite_img.paste(strip, (x, 0))
+        offsets.append(x)
+        x += strip.width
+        strip.close()
+    black_line.close()
+    white_line.close()
+    return composite_img, offsets
+
+
+def composite_file(
+    filename, input_dirs, labels, output_dir, font, profiler=null_profiler
+):
+    """
+    Creates and saves the composite for one filename. Returns a result dict with
+    name, status ("created", "skipped" or "error") and error. Stage timings go to
+    profiler.
+    """
+    result = {"name": filename, "status": "created", "error": None}
+    # Check that the corresponding files exist
+    missing = [
+        label
+        for d, label in zip(input_dirs[1:], labels[1:])
+        if not os.path.exists(os.path.join(d, filename))
+    ]
+    if missing:
+        result["status"] = "skipped"
+        result["error"] = f"Corresponding {', '.join(missing)} file not found"
+        return result
+
+    profiler.begin_file(filename)
+    images = []
+    try:
+        with profiler.stage("decode"):
+            for d in input_dirs:
+                images.append(Image.open(os.path.join(d, filename)))
+                images[-1].load()
+        composite_img = make_composite(images, labels, font, profiler=profiler)
+        with profiler.stage("save"):
+            composite_img.save(os.path.join(output_dir, filename))
+        composite_img.close()
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    finally:
+        for img in images:
+            img.close()
+    return result
+
+
+def _composite_worker(job):
+    filename, input_dirs, labels, output_dir, font_path, font_size, profile = job
+    font = cached_font(font_path, font_size)
+    if profile is None:
+        return composite_file(filename, input_dirs, labels, output_dir, font)
+    # Records travel back with the result and are merged by the parent
+    profiler = Profiler(track_memory=profile)
+    result = composite_file(filename, input_dirs, labels, output_dir, font, profiler)
+    result["profile"] = profiler.records
+    return result
+
+
+def bounded_map(executor, fn, jobs, max_in_flight):
+    """
+    Like executor.map, but keeps at most max_in_flight jobs submitted at a time, so
+    only that many sets of decoded inputs exist at once. Results are yielded in
+    input order.
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append(executor.submit(fn, job))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def print_summary(results, elapsed):
+    """Prints counts, throughput and any per-file skips or errors."""
+    created = sum(1 for r in results if r["status"] == "created")
+    unchanged = sum(1 for r in results if r["status"] == "unchanged")
+    skipped = [r for r in results if r["status"] == "skipped"]
+    errors = [r for r in results if r["status"] == "error"]
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+
+    print("\n--- Summary ---")
+    print(f"Processed {len(results)} files in {elapsed:.2f}s ({rate:.1f} files/sec)")
+    print(
+        f"Created: {created}, Unchanged: {unchanged}, Skipped: {len(skipped)}, "
+        f"Errors: {len(errors)}"
+    )
+    if skipped:
+        print("Skipped:")
+        for r in skipped:
+            print(f"  {r['name']}: {r['error']}")
+    if errors:
+        print("Errors:")
+        for r in errors:
+            print(f"  {r['name']}: {r['error']}")
+
+
+def _report(result):
+    if result["status"] == "created":
+        print(
+            f"Created composite image with strips, lines, and labels: {result['name']}"
+        )
+    return result
+
+
+def layout_params(input_dirs, labels, font):
+    """Everything besides the inputs that affects a composite's pixels."""
+    return {
+        "input_dirs": [os.path.abspath(d) for d in input_dirs],
+        "labels": list(labels),
+        "font": font_fingerprint(font),
+        "label_color": label_color,
+        "stroke_color": stroke_color,
+        "stroke_width": stroke_width,
+        "line_width": line_width,
+        "text_padding": text_padding,
+    }
+
+
+def run(
+    input_dirs,
+    labels,
+    output_dir,
+    font_path="arial.ttf",
+    font_size=font_size,
+    workers=1,
+    max_in_flight=None,
+    use_cache=True,
+    force=False,
+    profiler=null_profiler,
+):
+    """
+    Creates a composite for every file in the first input directory that also
+    exists (by name) in all the others, and returns the per-file results.
+
+    With workers > 1 files are composited in a process pool, with at most
+    max_in_flight files (default: 2 per worker) decoded at once. Output is the
+    same as a serial run.
+
+    With use_cache, each output's cache key (input sizes/mtimes, layout, labels,
+    font) is kept in a sidecar index in output_dir, and composites whose key is
+    unchanged are skipped unless force is set.
+
+    Pass a profiler.Profiler to collect per-stage timings (from workers too).
+    """
+    if len(input_dirs) != len(labels):
+        raise ValueError("Need exactly one label per input directory.")
+    # Load once up front so a missing font is reported a single time
+    font = load_font(font_path, font_size)
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+
+    filenames = sorted(os.listdir(input_dirs[0]))
+    start = time.perf_counter()
+
+    cache = CacheIndex(output_dir) if use_cache else None
+    keys = {}
+    unchanged = []
+    if cache is not None:
+        params = layout_params(input_dirs, labels, font)
+        todo = []
+        for filename in filenames:
+            paths = [os.path.join(d, filename) for d in input_dirs]
+            if not all(os.path.isfile(p) for p in paths):
+                # composite_file reports the missing inputs
+                todo.append(filename)
+                continue
+            keys[filename] = cache_key(paths, params)
+            if not force and cache.is_current(filename, keys[filename]):
+                unchanged.append(
+                    {"name": filename, "status": "unchanged", "error": None}
+                )
+            else:
+                todo.append(filename)
+        filenames = todo
+
+    def report(result):
+        profiler.extend(result.pop("profile", ()))
+        if result["status"] == "created" and result["name"] in keys:
+            cache.record(result["name"], keys[result["name"]])
+        return _report(result)
+
+    if workers > 1:
+        if max_in_flight is None:
+            max_in_flight = workers * 2
+        profile = profiler.track_memory if profiler.enabled else None
+        jobs = (
+            (filename, input_dirs, labels, output_dir, font_path, font_size, profile)
+            for filename in filenames
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = bounded_map(
+                executor, _composite_worker, jobs, max(1, max_in_flight)
+            )
+            results = [report(r) for r in results]
+    else:
+        results = [
+            report(
+                composite_file(filename, input_dirs, labels, output_dir, font, profiler)
+            )
+            for filename in filenames
+        ]
+    if cache is not None:
+        cache.close()
+    results = sorted(unchanged + results, key=lambda r: r["name"])
+
+    print_summary(results, time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Create side-by-side strip composites from any number of image directories."
+    )
+    parser.add_argument(
+        "--dirs", nargs="+", required=True, help="Input directories, left to right."
+    )
+    parser.add_argument(
+        "--labels", nargs="+", required=True, help="One label per input directory."
+    )
+    parser.add_argument("--output", required=True, help="Output directory.")
+    parser.add_argument("--font", default="arial.ttf", help="TrueType font path.")
+    parser.add_argument("--font-size", type=int, default=font_size)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes (default: 1, serial).",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Most files decoded at once in parallel mode (default: 2 per worker).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every composite, even if its cache key is unchanged.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't read or write the sidecar cache index.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each stage (decode, resize, assemble, labels, save) and print a summary.",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also record allocations (tracemalloc) and RSS per stage.",
+    )
+    parser.add_argument(
+        "--profile-json", help="Write profile records to this JSON file."
+    )
+    parser.add_argument("--trace", help="Write a Chrome trace (chrome://tracing) here.")
+    args = parser.parse_args()
+
+    profiling = args.profile or args.profile_memory or args.profile_json or args.trace
+    profiler = Profiler(args.profile_memory) if profiling else null_profiler
+
+    run(
+        args.dirs,
+        args.labels,
+        args.output,
+        font_path=args.font,
+        font_size=args.font_size,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        use_cache=not args.no_cache,
+        force=args.force,
+        profiler=profiler,
+    )
+
+    if profiler.enabled:
+        profiler.print_summary()
+        if args.profile_json:
+            profiler.write_json(args.profile_json)
+        if args.trace:
+            profiler.write_chrome_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import os
+import html
+import time
+import argparse
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from composite_engine import (
+    bounded_map,
+    cached_font,
+    load_font,
+    make_composite,
+    print_summary,
+)
+
+# Default sheet layout
+thumb_size = (320, 180)  # Cell size; thumbnails are fit within it
+columns = 8
+rows = 6
+gap = 4  # Pixels between and around cells
+background_color = (32, 32, 32)
+sheet_quality = 90  # JPEG quality of the sheets
+
+
+def parse_size(spec):
+    """Parses "WxH" for argparse."""
+    try:
+        width, height = (int(v) for v in spec.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Size must be WxH, got '{spec}'")
+    return width, height
+
+
+def load_thumbnail(path, size):
+    """
+    Thumbnail of the image at path, fit within size. JPEGs are decoded straight at
+    a reduced scale (draft) and large reductions are done with reduce() first.
+    """
+    with Image.open(path) as img:
+        img.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        return img.convert("RGB")
+
+
+def composite_thumbnail(paths, labels, font, size):
+    """
+    Builds a composite of the images at paths directly at thumbnail height, so no
+    full size composite is decoded or written, then fits it within size.
+    """
+    images = []
+    try:
+        for p in paths:
+            img = Image.open(p)
+            images.append(img)
+            # JPEG decodes at the smallest DCT scale still at least this large
+            height = size[1]
+            img.draft("RGB", (max(1, img.width * height // img.height), height))
+        composite_img = make_composite(images, labels, font, target_height=size[1])
+    finally:
+        for img in images:
+            img.close()
+    composite_img.thumbnail(size, Image.Resampling.LANCZOS)
+    return composite_img
+
+
+def thumbnail_file(filename, input_dirs, labels, font, size):
+    """
+    Returns (result dict, thumbnail or None) for one filename. With labels, a
+    composite of the same file in every input dir is built; without, the file in
+    input_dirs[0] (e.g. an existing composite) is thumbnailed as is.
+    """
+    result = {"name": filename, "status": "created", "error": None}
+    paths = [os.path.join(d, filename) for d in input_dirs]
+    if labels:
+        missing = [label for p, label in zip(paths, labels) if not os.path.exists(p)]
+        if missing:
+            result["status"] = "skipped"
+            result["error"] = f"Corresponding {', '.join(missing)} file not found"
+            return result, None
+    try:
+        if labels:
+            thumb = composite_thumbnail(paths, labels, font, size)
+        else:
+            thumb = load_thumbnail(paths[0], size)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+        return result, None
+    return result, thumb
+
+
+def _thumbnail_worker(job):
+    filename, input_dirs, labels, font_spec, size = job
+    font = cached_font(*font_spec) if labels else None
+    return thumbnail_file(filename, input_dirs, labels, font, size)
+
+
+def _sheet_html(sheet_name, areas):
+    """One sheet image and its image map, linking each tile to its file."""
+    map_name = os.path.splitext(sheet_name)[0]
+    lines = [
+        f'<h2 id="{map_name}">{map_name}</h2>',
+        f'<img src="{sheet_name}" usemap="#{map_name}" loading="lazy" alt="{map_name}">',
+        f'<map name="{map_name}">',
+    ]
+    for name, href, (x0, y0, x1, y1) in areas:
+        name = html.escape(name, quote=True)
+        href = html.escape(quote(href), quote=True)
+        lines.append(
+            f'  <area shape="rect" coords="{x0},{y0},{x1},{y1}" href="{href}" '
+            f'title="{name}" alt="{name}">'
+        )
+    lines.append("</map>")
+    return "\n".join(lines)
+
+
+def write_index(output_dir, sheets):
+    """Writes index.html with every sheet and its image map."""
+    body = "\n".join(_sheet_html(name, areas) for name, areas in sheets)
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            "<title>Contact sheets</title>\n"
+            "<style>body{background:#202020;color:#ddd;font-family:sans-serif}"
+            "img{display:block;max-width:none}</style>\n</head>\n<body>\n"
+            f"{body}\n</body>\n</html>\n"
+        )
+
+
+def run(
+    input_dirs,
+    output_dir,
+    labels=None,
+    font_path="arial.ttf",
+    font_size=15,
+    size=thumb_size,
+    columns=columns,
+    rows=rows,
+    workers=1,
+    max_in_flight=None,
+):
+    """
+    Packs a thumbnail of every file in input_dirs[0] into paged contact sheets
+    (columns x rows per sheet) in output_dir, plus an index.html whose image maps
+    link each tile to its file. With labels, each tile is a composite of the same
+    file in all input_dirs, built at thumbnail size. Returns the per-file results.
+    """
+    if labels and len(input_dirs) != len(labels):
+        raise ValueError("Need exactly one label per input directory.")
+    font = load_font(font_path, font_size) if labels else None
+    os.makedirs(output_dir, exist_ok=True)
+
+    filenames = sorted(
+        f
+        for f in os.listdir(input_dirs[0])
+        if os.path.isfile(os.path.join(input_dirs[0], f))
+    )
+    per_sheet = columns * rows
+    cell_width, cell_height = size
+    sheet_size = (
+        columns * (cell_width + gap) + gap,
+        rows * (cell_height + gap) + gap,
+    )
+
+    start = time.perf_counter()
+    if workers > 1:
+        if max_in_flight is None:
+            max_in_flight = workers * 4
+        executor = ProcessPoolExecutor(max_workers=workers)
+        jobs = (
+            (f, input_dirs, labels, (font_path, font_size), size) for f in filenames
+        )
+        thumbnails = bounded_map(
+            executor, _thumbnail_worker, jobs, max(1, max_in_flight)
+        )
+    else:
+        executor = None
+        thumbnails = (
+            thumbnail_file(f, input_dirs, labels, font, size) for f in filenames
+        )
+
+    results = []
+    sheets = []
+    sheet = None
+    areas = []
+
+    def save_sheet():
+        sheet_name = f"sheet_{len(sheets) + 1:04d}.jpg"
+        sheet.save(os.path.join(output_dir, sheet_name), quality=sheet_quality)
+        sheets.append((sheet_name, areas))
+        print(f"Saved {sheet_name} ({len(areas)} tiles)")
+
+    try:
+        for result, thumb in thumbnails:
+            results.append(result)
+            if thumb is None:
+                continue
+            if sheet is None:
+                sheet = Image.new("RGB", sheet_size, background_color)
+                areas = []
+            index = len(areas)
+            x = gap + (index % columns) * (cell_width + gap)
+            y = gap + (index // columns) * (cell_height + gap)
+            # Center the thumbnail in its cell
+            x += (cell_width - thumb.width) // 2
+            y += (cell_height - thumb.height) // 2
+            sheet.paste(thumb, (x, y))
+            href = os.path.relpath(
+                os.path.join(input_dirs[0], result["name"]), output_dir
+            ).replace(os.sep, "/")
+            areas.append(
+                (result["name"], href, (x, y, x + thumb.width, y + thumb.height))
+            )
+            thumb.close()
+            if len(areas) == per_sheet:
+                save_sheet()
+                sheet.close()
+                sheet = None
+        if sheet is not None:
+            save_sheet()
+            sheet.close()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    write_index(output_dir, sheets)
+    print_summary(results, time.perf_counter() - start)
+    print(f"{len(sheets)} sheets, index: {os.path.join(output_dir, 'index.html')}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pack thumbnails of a comparison directory into paged contact sheets with an HTML index."
+    )
+    parser.add_argument(
+        "--dirs",
+        nargs="+",
+        required=True,
+        help="A directory of composites, or several input directories with --labels.",
+    )
+    parser.add_argument(
+        "--labels",
+        nargs="+",
+        help="Build each tile as a strip composite of the same file in every --dirs entry.",
+    )
+    parser.add_argument("--output", required=True, help="Output directory.")
+    parser.add_argument(
+        "--thumb-size",
+        type=parse_size,
+        default=thumb_size,
+        help=f"Cell size WxH (default: {thumb_size[0]}x{thumb_size[1]}).",
+    )
+    parser.add_argument("--columns", type=int, default=columns)
+    parser.add_argument("--rows", type=int, default=rows)
+    parser.add_argument("--font", default="arial.ttf", help="TrueType font path.")
+    parser.add_argument("--font-size", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    args = parser.parse_args()
+
+    run(
+        args.dirs,
+        args.output,
+        labels=args.labels,
+        font_path=args.font,
+        font_size=args.font_size,
+        size=args.thumb_size,
+        columns=args.columns,
+        rows=args.rows,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+# Default tile side, in pixels
+tile_size = 64
+
+# Image rows scored per step: keeps the temporaries cache sized
+band_rows = 256
+
+# SSIM stabilising constants for 8-bit data
+_c1 = (0.01 * 255) ** 2
+_c2 = (0.03 * 255) ** 2
+
+
+def to_array(img, mode):
+    """
+    Converts a PIL image to mode and exports it as a uint8 array, band by band:
+    for luma, band sized exports stay in cache and run about three times as fast
+    as one full export.
+    """
+    if img.mode != mode:
+        img = img.convert(mode)
+    width, height = img.size
+    channels = len(img.getbands())
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    array = np.empty(shape, np.uint8)
+    for top in range(0, height, band_rows):
+        bottom = min(height, top + band_rows)
+        array[top:bottom] = np.asarray(img.crop((0, top, width, bottom)))
+    return array
+
+
+def _bands(img, mode, tile):
+    """
+    Yields (first tile row, uint8 array) for bands of whole tile rows of img (a PIL
+    image, converted to mode, or a uint8 array), cropped to whole tiles.
+
+    Luma comes from Pillow's convert("L") (integer ITU-R 601 weights): once for a
+    whole PIL image, which is then exported once and sliced, or band by band for
+    RGB arrays. RGB PIL images are exported band by band instead, since a band
+    sized export stays in cache and runs about twice as fast as one full export.
+    """
+    if isinstance(img, Image.Image):
+        if img.mode != mode:
+            img = img.convert(mode)
+        if mode == "L":
+            img = np.asarray(img)
+        width, height = img.shape[1::-1] if isinstance(img, np.ndarray) else img.size
+    else:
+        img = np.asarray(img, dtype=np.uint8)
+        height, width = img.shape[:2]
+    tiles_y, tiles_x = height // tile, width // tile
+    step = max(1, band_rows // tile)
+    for first in range(0, tiles_y, step):
+        last = min(tiles_y, first + step)
+        top, bottom = first * tile, last * tile
+        if isinstance(img, Image.Image):
+            band = np.asarray(img.crop((0, top, tiles_x * tile, bottom)))
+        else:
+            band = img[top:bottom]
+            if mode == "L" and band.ndim == 3:
+                rgb = Image.fromarray(np.ascontiguousarray(band[..., :3]))
+                band = np.asarray(rgb.convert("L"))
+            band = band[:, : tiles_x * tile]
+        yield first, band
+
+
+def _tile_sums(values, tile, tiles_x, row_dtype):
+    """
+    Sums a band of values over each tile: the tile's rows first (contiguous, and
+    narrow enough to accumulate in row_dtype), then its columns.
+    """
+    rows = np.add.reduce(
+        values.reshape(-1, tile, values[0].size), axis=1, dtype=row_dtype
+    )
+    return rows.reshape(rows.shape[0], tiles_x, -1).sum(axis=2, dtype=np.uint64)
+
+
+def _map_shape(img, tile):
+    width, height = img.size if isinstance(img, Image.Image) else img.shape[1::-1]
+    return height // tile, width // tile
+
+
+def mae_map(reference, other, tile=tile_size):
+    """Per-tile mean absolute error over all channels, as a float32 array."""
+    tiles_y, tiles_x = _map_shape(reference, tile)
+    dmap = np.empty((tiles_y, tiles_x), np.float32)
+    # A tile column of 8-bit values fits in uint16 up to 257 rows
+    row_dtype = np.uint16 if tile <= 257 else np.uint32
+    bands = zip(_bands(reference, "RGB", tile), _bands(other, "RGB", tile))
+    buffers = {}
+    for (first, a), (_, b) in bands:
+        # |a - b| without leaving uint8: max - min can't wrap. The buffers are
+        # reused across bands so each band doesn't fault in fresh pages.
+        if buffers.get("shape") != a.shape:
+            buffers = {"shape": a.shape, "diff": np.empty(a.shape, np.uint8)}
+            buffers["low"] = np.empty(a.shape, np.uint8)
+        diff, low = buffers["diff"], buffers["low"]
+        np.maximum(a, b, out=diff)
+        np.minimum(a, b, out=low)
+        np.subtract(diff, low, out=diff)
+        channels = diff.shape[2] if diff.ndim == 3 else 1
+        sums = _tile_sums(diff, tile, tiles_x, row_dtype)
+        dmap[first : first + len(sums)] = sums / (tile * tile * channels)
+    return dmap
+
+
+def ssim_map(reference, other, tile=tile_size):
+    """
+    Per-tile 1 - SSIM on luma, using each tile's mean/variance/covariance (no
+    gaussian window), as a float32 array: 0 for identical tiles, higher is worse.
+    """
+    tiles_y, tiles_x = _map_shape(reference, tile)
+    dmap = np.empty((tiles_y, tiles_x), np.float32)
+    n = tile * tile
+    row_dtype = np.uint16 if tile <= 257 else np.uint32
+    bands = zip(_bands(reference, "L", tile), _bands(other, "L", tile))
+    buffers = {}
+    for (first, a), (_, b) in bands:
+        # Exact integer sums: products of 8-bit values fit in uint16. The buffers
+        # are reused across bands so each band doesn't fault in fresh pages.
+        if buffers.get("shape") != a.shape:
+            buffers = {"shape": a.shape}
+            for name in ("x", "y", "product"):
+                buffers[name] = np.empty(a.shape, np.uint16)
+        x, y, product = buffers["x"], buffers["y"], buffers["product"]
+        np.copyto(x, a)
+        np.copyto(y, b)
+        mean_x = _tile_sums(a, tile, tiles_x, row_dtype) / n
+        mean_y = _tile_sums(b, tile, tiles_x, row_dtype) / n
+        np.multiply(x, x, out=product)
+        var_x = _tile_sums(product, tile, tiles_x, np.uint32) / n - mean_x * mean_x
+        np.multiply(y, y, out=product)
+        var_y = _tile_sums(product, tile, tiles_x, np.uint32) / n - mean_y * mean_y
+        np.multiply(x, y, out=product)
+        cov = _tile_sums(product, tile, tiles_x, np.uint32) / n - mean_x * mean_y
+        ssim = ((2 * mean_x * mean_y + _c1) * (2 * cov + _c2)) / (
+            (mean_x * mean_x + mean_y * mean_y + _c1) * (var_x + var_y + _c2)
+        )
+        dmap[first : first + len(ssim)] = 1 - ssim
+    return dmap
+
+
+diff_methods = {"mae": mae_map, "ssim": ssim_map}
+
+
+def diff_map(reference, other, tile=tile_size, method="mae"):
+    """
+    Per-tile difference between two same-sized images (PIL images or uint8 arrays).
+    Partial tiles on the right and bottom edges are left out.
+    """
+    if method not in diff_methods:
+        raise ValueError(
+            f"Unknown diff method '{method}', use one of {list(diff_methods)}"
+        )
+    size_a = (
+        reference.size if isinstance(reference, Image.Image) else reference.shape[1::-1]
+    )
+    size_b = other.size if isinstance(other, Image.Image) else other.shape[1::-1]
+    if tuple(size_a) != tuple(size_b):
+        raise ValueError(f"Image sizes differ: {tuple(size_a)} vs {tuple(size_b)}")
+    return diff_methods[method](reference, other, tile)
+
+
+def top_tiles(dmap, count, tile=tile_size):
+    """
+    The count highest-scoring tiles of a diff map, worst first, as
+    (x, y, w, h, score) boxes in image pixels.
+    """
+    flat = dmap.ravel()
+    count = min(count, flat.size)
+    if count <= 0:
+        return []
+    best = np.argpartition(flat, flat.size - count)[flat.size - count :]
+    best = best[np.argsort(flat[best])[::-1]]
+    tiles_x = dmap.shape[1]
+    return [
+        (int(i % tiles_x) * tile, int(i // tiles_x) * tile, tile, tile, float(flat[i]))
+        for i in best
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the most divergent tiles between two images."
+    )
+    parser.add_argument("reference", help="Reference image (e.g. HQ).")
+    parser.add_argument("other", help="Image to compare (resized to the reference).")
+    parser.add_argument("--tile", type=int, default=tile_size)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--method", choices=list(diff_methods), default="mae")
+    args = parser.parse_args()
+
+    reference = Image.open(args.reference).convert("RGB")
+    other = Image.open(args.other).convert("RGB")
+    if other.size != reference.size:
+        other = other.resize(reference.size, Image.Resampling.BICUBIC)
+
+    start = time.perf_counter()
+    dmap = diff_map(reference, other, args.tile, args.method)
+    elapsed = time.perf_counter() - start
+    megapixels = reference.width * reference.height / 1e6
+    print(
+        f"{dmap.shape[1]}x{dmap.shape[0]} tiles, {megapixels:.1f} MP in "
+        f"{elapsed * 1000:.1f} ms ({megapixels / elapsed:.0f} MP/s)"
+    )
+    for x, y, w, h, score in top_tiles(dmap, args.top, args.tile):
+        print(f"  {x},{y},{w},{h}  {args.method} {score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
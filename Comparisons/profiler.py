@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+_page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss_bytes():
+    """Current resident set size (Linux), or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _page_size
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off: every stage is a shared no-op context."""
+
+    enabled = False
+    records = ()
+    _null = nullcontext()
+
+    def begin_file(self, name):
+        pass
+
+    def extend(self, records):
+        pass
+
+    def stage(self, name):
+        return self._null
+
+
+null_profiler = NullProfiler()
+
+
+class Profiler:
+    """
+    Records wall time per (file, stage), and with track_memory also the peak Python
+    /NumPy allocation (tracemalloc) and the RSS change during the stage. Pillow
+    allocates pixel buffers outside tracemalloc's view, so those only show up in the
+    RSS delta.
+
+    Records are plain dicts, so worker processes can return them with their results
+    and the parent merges them with extend().
+    """
+
+    enabled = True
+
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.records = []
+        self.current_file = None
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def begin_file(self, name):
+        """Following stages are attributed to file name."""
+        self.current_file = name
+
+    @contextmanager
+    def stage(self, name):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+            rss_before = _rss_bytes()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            record = {
+                "file": self.current_file,
+                "stage": name,
+                "start_ns": start,
+                "duration_ns": end - start,
+                "pid": os.getpid(),
+            }
+            if self.track_memory:
+                record["alloc_peak"] = (
+                    tracemalloc.get_traced_memory()[1] - traced_before
+                )
+                rss_after = _rss_bytes()
+                if rss_before is not None and rss_after is not None:
+                    record["rss_delta"] = rss_after - rss_before
+            self.records.append(record)
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    def summary(self):
+        """Per-stage aggregates, most expensive stage first."""
+        stages = {}
+        for r in self.records:
+            stages.setdefault(r["stage"], []).append(r)
+        total_ns = sum(r["duration_ns"] for r in self.records) or 1
+        rows = []
+        for name, records in stages.items():
+            durations = sorted(r["duration_ns"] for r in records)
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            row = {
+                "stage": name,
+                "count": len(records),
+                "total_ms": sum(durations) / 1e6,
+                "mean_ms": sum(durations) / len(durations) / 1e6,
+                "p95_ms": p95 / 1e6,
+                "share": sum(durations) / total_ns,
+            }
+            if self.track_memory:
+                row["alloc_peak_mb"] = max(r["alloc_peak"] for r in records) / 1e6
+                deltas = [r["rss_delta"] for r in records if "rss_delta" in r]
+                row["rss_delta_max_mb"] = max(deltas) / 1e6 if deltas else None
+            rows.append(row)
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def print_summary(self):
+        rows = self.summary()
+        if not rows:
+            return
+        files = len({r["file"] for r in self.records})
+        print(f"\n--- Profile ({files} files) ---")
+        header = f"{'stage':<12}{'count':>7}{'total ms':>11}{'mean ms':>10}{'p95 ms':>10}{'share':>8}"
+        if self.track_memory:
+            header += f"{'alloc MB':>10}{'rss MB':>9}"
+        print(header)
+        for row in rows:
+            line = (
+                f"{row['stage']:<12}{row['count']:>7}{row['total_ms']:>11.1f}"
+                f"{row['mean_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['share']:>8.1%}"
+            )
+            if self.track_memory:
+                rss = row["rss_delta_max_mb"]
+                line += f"{row['alloc_peak_mb']:>10.1f}"
+                line += f"{rss:>9.1f}" if rss is not None else f"{'-':>9}"
+            print(line)
+
+    def write_json(self, path):
+        """Writes the raw records and the per-stage summary."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "records": self.records}, f, indent=1)
+
+    def write_chrome_trace(self, path):
+        """Writes the records as a Chrome trace (chrome://tracing, Perfetto)."""
+        events = []
+        for r in self.records:
+            args = {"file": r["file"]}
+            for key in ("alloc_peak", "rss_delta"):
+                if key in r:
+                    args[key] = r[key]
+            events.append(
+                {
+                    "name": r["stage"],
+                    "cat": "composite",
+                    "ph": "X",
+                    "ts": r["start_ns"] / 1000,
+                    "dur": r["duration_ns"] / 1000,
+                    "pid": r["pid"],
+                    "tid": r["pid"],
+                    "args": args,
+                }
+            )
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,418 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from composite_engine import (
+    bounded_map,
+    cached_font,
+    load_font,
+    paste_label,
+    print_summary,
+    text_padding,
+)
+from diffmap import diff_map, to_array, top_tiles
+
+# Default grid layout
+zoom = 4  # Nearest-neighbour magnification of the reference crop
+box_size = 64  # Side of auto-picked boxes, in reference pixels
+auto_count = 3  # Boxes picked per image set in auto mode
+gap = 2  # Pixels between cells
+background_color = (0, 0, 0)
+
+
+def parse_box(spec):
+    """Parses "x,y,w,h" (reference image pixels) for argparse."""
+    try:
+        x, y, w, h = (int(v) for v in spec.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Box must be x,y,w,h, got '{spec}'")
+    if w <= 0 or h <= 0:
+        raise argparse.ArgumentTypeError(f"Box width and height must be > 0: '{spec}'")
+    return x, y, w, h
+
+
+# Bytes per pixel of the raw layouts that can be decoded a band of rows at a time
+_raw_bytes_per_pixel = {
+    "L": 1,
+    "P": 1,
+    "LA": 2,
+    "RGB": 3,
+    "BGR": 3,
+    "RGBA": 4,
+    "RGBX": 4,
+    "BGRA": 4,
+    "BGRX": 4,
+    "XBGR": 4,
+    "ABGR": 4,
+    "CMYK": 4,
+    "I;16": 2,
+    "I;16B": 2,
+    "I;16L": 2,
+}
+
+
+def _can_restrict_rows(img):
+    """
+    True if img still has the private Pillow ImageFile attributes (_size and the
+    tile list) that open_region rewrites to decode fewer rows. They have no public
+    API, so if a Pillow release drops them open_region decodes the whole image.
+    """
+    return hasattr(img, "_size") and isinstance(getattr(img, "tile", None), list)
+
+
+def _band_tiles(img, top, bottom):
+    """
+    Decoder tiles covering rows [top, bottom) of an uncompressed image (BMP, PPM,
+    uncompressed TIFF), shifted so the band starts at row 0, or None if the
+    image's layout can't be decoded in bands. Mirrors Resize/resize_utils.py.
+    """
+    tiles = []
+    for tile in img.tile:
+        codec, (x0, y0, x1, y1), offset, args = tile[:4]
+        if codec != "raw":
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode = args[0]
+        stride = args[1] if len(args) > 1 else 0
+        orientation = args[2] if len(args) > 2 else 1
+        if rawmode not in _raw_bytes_per_pixel or orientation not in (1, -1):
+            return None
+        if stride <= 0:
+            stride = (x1 - x0) * _raw_bytes_per_pixel[rawmode]
+
+        band_y0, band_y1 = max(y0, top), min(y1, bottom)
+        if band_y0 >= band_y1:
+            continue
+        if orientation == 1:
+            band_offset = offset + (band_y0 - y0) * stride
+        else:
+            # Bottom-up rows: the band's last row is stored first
+            band_offset = offset + (y1 - band_y1) * stride
+        tiles.append(
+            (
+                "raw",
+                (x0, band_y0 - top, x1, band_y1 - top),
+                band_offset,
+                (rawmode, stride, orientation),
+            )
+        )
+    return tiles
+
+
+def _restrict_rows(img, top, bottom):
+    """
+    Points a freshly opened uncompressed image at rows [top, bottom) only, so
+    load() decodes just that band. Returns False, leaving img untouched, if it
+    can't be decoded in bands.
+    """
+    tiles = _band_tiles(img, top, bottom)
+    if not tiles:
+        return False
+    img._size = (img.width, bottom - top)
+    if hasattr(img, "_tile_size"):
+        # TIFF allocates its buffer from this rather than from size
+        img._tile_size = img._size
+    img.tile = tiles
+    return True
+
+
+def open_region(path, box):
+    """
+    Returns the (left, top, right, bottom) region of the image at path, decoding as
+    little as the format allows: only the region's rows for uncompressed formats,
+    only the rows down to its bottom edge for non-interlaced PNG, and the whole image
+    otherwise (also if Pillow's internals have changed, see _can_restrict_rows).
+    """
+    left, top, right, bottom = box
+    img = Image.open(path)
+    width = img.width
+    try:
+        if _can_restrict_rows(img):
+            if _restrict_rows(img, top, bottom):
+                top, bottom = 0, bottom - top
+            elif (
+                len(img.tile) == 1
+                and img.tile[0][0] == "zip"
+                and not img.info.get("interlace")
+            ):
+                # The PNG decoder stops once the image buffer is full
+                codec, extents, offset, args = img.tile[0][:4]
+                img._size = (width, bottom)
+                img.tile = [(codec, (0, 0, width, bottom), offset, args)]
+        img.load()
+        return img.crop((left, top, right, bottom))
+    finally:
+        img.close()
+
+
+def scale_box(box, size, reference_size):
+    """Maps an (x, y, w, h) reference box to (left, top, right, bottom) in size."""
+    x, y, w, h = box
+    sx = size[0] / reference_size[0]
+    sy = size[1] / reference_size[1]
+    left, top = int(x * sx), int(y * sy)
+    right = max(left + 1, round((x + w) * sx))
+    bottom = max(top + 1, round((y + h) * sy))
+    return left, top, min(right, size[0]), min(bottom, size[1])
+
+
+def clamp_box(box, size):
+    """Clips an (x, y, w, h) box to an image of size, or returns None if empty."""
+    x, y, w, h = box
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(size[0], x + w), min(size[1], y + h)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def auto_boxes(reference_img, other_img, count=auto_count, size=box_size, method="mae"):
+    """
+    Picks the count box-sized tiles of reference_img where other_img differs most
+    in luma (see diffmap.py for the methods), as (x, y, w, h) reference boxes.
+    """
+    if reference_img.width < size or reference_img.height < size:
+        return [(0, 0, reference_img.width, reference_img.height)]
+    # Both methods score luma arrays: exported once, they take diffmap's fast
+    # path, where exporting RGB would cost more than the scoring itself
+    other_img = other_img.convert("L")
+    if other_img.size != reference_img.size:
+        other_img = other_img.resize(reference_img.size, Image.Resampling.BICUBIC)
+    reference, other = to_array(reference_img, "L"), to_array(other_img, "L")
+    dmap = diff_map(reference, other, size, method)
+    return [tile[:4] for tile in top_tiles(dmap, count, size)]
+
+
+def roi_sheet(crops, labels, boxes, zoom, font):
+    """
+    Assembles a grid with one row per box and one column per input. crops[i][j] is
+    box j cut from input i; every cell is magnified (nearest neighbour) to the box
+    size times zoom, so lower resolution inputs show their real pixels.
+    """
+    cell_sizes = [(w * zoom, h * zoom) for _, _, w, h in boxes]
+    columns = len(crops)
+    sheet_width = max(w for w, _ in cell_sizes) * columns + gap * (columns - 1)
+    sheet_height = sum(h for _, h in cell_sizes) + gap * (len(boxes) - 1)
+    sheet = Image.new("RGB", (sheet_width, sheet_height), background_color)
+
+    y = 0
+    for j, (cell_width, cell_height) in enumerate(cell_sizes):
+        for i, label in enumerate(labels):
+            x = i * (cell_width + gap)
+            cell = crops[i][j].convert("RGB")
+            cell = cell.resize((cell_width, cell_height), Image.Resampling.NEAREST)
+            sheet.paste(cell, (x, y))
+            paste_label(sheet, (x + text_padding, y + text_padding), label, font)
+        y += cell_height + gap
+    return sheet
+
+
+def roi_file(
+    filename,
+    input_dirs,
+    labels,
+    output_dir,
+    font,
+    boxes=None,
+    auto=auto_count,
+    size=box_size,
+    zoom=zoom,
+    reference=None,
+    method="mae",
+):
+    """
+    Builds and saves the ROI grid for one filename present in every input dir, as
+    PNG. Boxes are (x, y, w, h) in the reference input's pixels (default: the
+    largest input); without boxes, auto tiles are picked where the last other input
+    differs most from the reference (method: "mae" or "ssim"). Returns a result dict
+    like composite_file.
+    """
+    result = {"name": filename, "status": "created", "error": None}
+    paths = [os.path.join(d, filename) for d in input_dirs]
+    missing = [label for p, label in zip(paths, labels) if not os.path.exists(p)]
+    if missing:
+        result["status"] = "skipped"
+        result["error"] = f"Corresponding {', '.join(missing)} file not found"
+        return result
+
+    try:
+        # Opening is lazy: only headers are read here
+        sizes = []
+        for p in paths:
+            with Image.open(p) as img:
+                sizes.append(img.size)
+        if reference is None:
+            reference = max(range(len(sizes)), key=lambda i: sizes[i][0] * sizes[i][1])
+        reference_size = sizes[reference]
+
+        decoded = {}
+        if not boxes:
+            other = max(i for i in range(len(paths)) if i != reference)
+            for i in (reference, other):
+                decoded[i] = Image.open(paths[i])
+                decoded[i].load()
+            boxes = auto_boxes(decoded[reference], decoded[other], auto, size, method)
+        boxes = [b for b in (clamp_box(b, reference_size) for b in boxes) if b]
+        if not boxes:
+            raise ValueError("No crop box lies inside the reference image")
+
+        crops = []
+        for i, p in enumerate(paths):
+            regions = [scale_box(b, sizes[i], reference_size) for b in boxes]
+            if i in decoded:
+                crops.append([decoded[i].crop(r) for r in regions])
+                decoded[i].close()
+                continue
+            # Decode the union of the boxes once, then cut each box from it
+            union = (
+                min(r[0] for r in regions),
+                min(r[1] for r in regions),
+                max(r[2] for r in regions),
+                max(r[3] for r in regions),
+            )
+            area = open_region(p, union)
+            crops.append(
+                [
+                    area.crop(
+                        (r[0] - union[0], r[1] - union[1])
+                        + (r[2] - union[0], r[3] - union[1])
+                    )
+                    for r in regions
+                ]
+            )
+            area.close()
+
+        sheet = roi_sheet(crops, labels, boxes, zoom, font)
+        sheet.save(os.path.join(output_dir, os.path.splitext(filename)[0] + ".png"))
+        sheet.close()
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+def _roi_worker(job):
+    filename, input_dirs, labels, output_dir, font_spec, options = job
+    return roi_file(
+        filename, input_dirs, labels, output_dir, cached_font(*font_spec), **options
+    )
+
+
+def run(
+    input_dirs,
+    labels,
+    output_dir,
+    font_path="arial.ttf",
+    font_size=15,
+    workers=1,
+    max_in_flight=None,
+    **options,
+):
+    """
+    Creates an ROI grid for every file in the first input directory that exists in
+    all the others. options are passed to roi_file (boxes, auto, size, zoom,
+    reference, method). Returns the per-file results.
+    """
+    if len(input_dirs) != len(labels):
+        raise ValueError("Need exactly one label per input directory.")
+    font = load_font(font_path, font_size)
+    os.makedirs(output_dir, exist_ok=True)
+
+    filenames = sorted(os.listdir(input_dirs[0]))
+    start = time.perf_counter()
+    if workers > 1:
+        if max_in_flight is None:
+            max_in_flight = workers * 2
+        jobs = (
+            (f, input_dirs, labels, output_dir, (font_path, font_size), options)
+            for f in filenames
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                bounded_map(executor, _roi_worker, jobs, max(1, max_in_flight))
+            )
+    else:
+        results = [
+            roi_file(f, input_dirs, labels, output_dir, font, **options)
+            for f in filenames
+        ]
+
+    print_summary(results, time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Create zoomed region-of-interest comparison grids from image directories."
+    )
+    parser.add_argument(
+        "--dirs", nargs="+", required=True, help="Input directories, left to right."
+    )
+    parser.add_argument(
+        "--labels", nargs="+", required=True, help="One label per input directory."
+    )
+    parser.add_argument("--output", required=True, help="Output directory.")
+    parser.add_argument(
+        "--box",
+        type=parse_box,
+        action="append",
+        help="Crop box x,y,w,h in reference pixels (repeatable). Default: auto-pick.",
+    )
+    parser.add_argument(
+        "--auto",
+        type=int,
+        default=auto_count,
+        help=f"Boxes to auto-pick when no --box is given (default: {auto_count}).",
+    )
+    parser.add_argument(
+        "--box-size",
+        type=int,
+        default=box_size,
+        help=f"Side of auto-picked boxes (default: {box_size}).",
+    )
+    parser.add_argument(
+        "--diff-method",
+        choices=["mae", "ssim"],
+        default="mae",
+        help="How auto-picked tiles are scored, on luma (default: mae).",
+    )
+    parser.add_argument(
+        "--zoom",
+        type=int,
+        default=zoom,
+        help=f"Magnification of the reference crop (default: {zoom}).",
+    )
+    parser.add_argument(
+        "--reference",
+        type=int,
+        default=None,
+        help="Index of the input whose pixels boxes are given in (default: largest).",
+    )
+    parser.add_argument("--font", default="arial.ttf", help="TrueType font path.")
+    parser.add_argument("--font-size", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    args = parser.parse_args()
+
+    run(
+        args.dirs,
+        args.labels,
+        args.output,
+        font_path=args.font,
+        font_size=args.font_size,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        boxes=args.box,
+        auto=args.auto,
+        size=args.box_size,
+        zoom=args.zoom,
+        reference=args.reference,
+        method=args.diff_method,
+    )
+
+
+if __name__ == "__main__":
+    main()
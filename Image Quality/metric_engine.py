@@ -0,0 +1,389 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from score_cache import CacheKey, ScoreCache
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def list_images(dir_path: str) -> List[str]:
+    """Sorted paths of the image files directly inside a directory."""
+    return [
+        os.path.join(dir_path, name)
+        for name in sorted(os.listdir(dir_path))
+        if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(dir_path, name))
+    ]
+
+
+def load_image(path: str, crop_size: Optional[int] = None) -> np.ndarray:
+    """
+    Decode an image to an RGB float32 CxHxW array in [0, 1] (the layout pyiqa
+    metrics take). With crop_size, take a centered crop_size x crop_size patch
+    (clamped to the image), so mixed-size images can share batches.
+    """
+    with Image.open(path) as img:
+        if crop_size:
+            width, height = img.size
+            w, h = min(crop_size, width), min(crop_size, height)
+            left, top = (width - w) // 2, (height - h) // 2
+            img = img.crop((left, top, left + w, top + h))
+        array = np.asarray(img.convert('RGB'), dtype=np.float32)
+    return np.ascontiguousarray(array.transpose(2, 0, 1)) / 255.0
+
+
+def prefetch(fn: Callable, items: Iterable, workers: int = 4, depth: Optional[int] = None) -> Iterator[Tuple[object, object]]:
+    """
+    Yield (item, fn(item)) in order while up to depth further items are processed
+    on background threads. Pillow releases the GIL while decoding, so decode
+    overlaps with inference in the consumer. A failed item yields its exception.
+    """
+    depth = depth or workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(fn, item)))
+            if len(pending) >= depth:
+                yield _take(pending)
+        while pending:
+            yield _take(pending)
+
+
+def _take(pending: deque) -> Tuple[object, object]:
+    item, future = pending.popleft()
+    try:
+        return item, future.result()
+    except Exception as e:
+        return item, e
+
+
+def split_metric(spec: str) -> Tuple[str, Optional[int]]:
+    """
+    Split a metric spec like 'nima:224' into the pyiqa metric name and the size the
+    input's shorter side is resized to before scoring (None, i.e. full resolution,
+    for a plain name like 'nima'). The size is a manual override: it is never read
+    from the metric's own configuration, and without it the metric gets the image
+    as is (and does any resizing of its own).
+    """
+    name, _, size = spec.partition(':')
+    if not size:
+        return name, None
+    if not size.isdigit() or int(size) < 1:
+        raise ValueError(f"Invalid input size in metric '{spec}', expected e.g. 'nima:224'.")
+    return name, int(size)
+
+
+def metric_options(spec: str, options: str = '') -> str:
+    """options with the spec's input size appended, e.g. 'crop=512,resize=224'."""
+    _, size = split_metric(spec)
+    if size:
+        options = ','.join(filter(None, [options, f'resize={size}']))
+    return options
+
+
+class Timings:
+    """Accumulated seconds and image counts per (metric, stage); metric '' is shared work."""
+
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, metric: str, stage: str, seconds: float, images: int = 1):
+        total = self.totals.setdefault((metric, stage), [0.0, 0])
+        total[0] += seconds
+        total[1] += images
+
+    def per_image_ms(self, metric: str, stage: str) -> Optional[float]:
+        total = self.totals.get((metric, stage))
+        if not total or not total[1]:
+            return None
+        return total[0] / total[1] * 1000
+
+    def print_summary(self):
+        """Print ms per image for the shared decode and for each metric's preprocessing and inference, then reset."""
+        if not self.totals:
+            return
+        print("Time per image:")
+        for stage, label in (('decode', 'decode + normalize'), ('to_device', 'copy to device')):
+            ms = self.per_image_ms('', stage)
+            if ms is not None:
+                print(f"  {label:<24}{ms:>9.2f} ms  ({self.totals[('', stage)][1]} images)")
+        for metric in sorted({metric for metric, _ in self.totals if metric}):
+            name, size = split_metric(metric)
+            prep = self.per_image_ms(metric, 'prep') or 0.0
+            inference = self.per_image_ms(metric, 'inference') or 0.0
+            print(f"  {name:<16}{f'{size}px' if size else 'full':>8}{prep:>9.2f} ms prep {inference:>9.2f} ms inference")
+        self.totals = {}
+
+
+def iter_batches(pairs: Iterable[Tuple[str, Optional[str]]], batch_size: int = 8, workers: int = 4, crop_size: Optional[int] = None, timings: Optional[Timings] = None, needs_decode: Optional[Callable[[Tuple[str, Optional[str]]], bool]] = None) -> Iterator[Tuple[List[Tuple[str, Optional[str]]], Optional[np.ndarray], Optional[np.ndarray]]]:
+    """
+    Decode (image, reference or None) pairs in the background and group them by
+    shape into batches of up to batch_size. Yields (pairs, images NxCxHxW,
+    references NxCxHxW or None). Partly filled groups are held back until they
+    fill, or until more than a few batches' worth of images are waiting, when the
+    fullest one is sent. That keeps memory bounded even if every size is different.
+    Pairs that fail to decode are reported and left out. Decode time (summed over
+    the background threads) is added to timings.
+
+    needs_decode, if given, is called for each pair on the background threads
+    first (e.g. to look its scores up in a cache); a pair it returns False for is
+    not decoded and is yielded on its own as ([pair], None, None).
+    """
+    def decode(pair):
+        if needs_decode and not needs_decode(pair):
+            return None
+        start = time.perf_counter()
+        image = load_image(pair[0], crop_size)
+        ref = load_image(pair[1], crop_size) if pair[1] else None
+        return image, ref, time.perf_counter() - start
+
+    groups = {}
+    waiting = 0
+    max_waiting = batch_size * 4
+    for pair, decoded in prefetch(decode, pairs, workers):
+        if isinstance(decoded, Exception):
+            print(f"Error loading {pair[0]}: {str(decoded)}")
+            continue
+        if decoded is None:
+            yield [pair], None, None
+            continue
+        image, ref, seconds = decoded
+        if timings:
+            timings.add('', 'decode', seconds)
+        key = (image.shape, None if ref is None else ref.shape)
+        group = groups.setdefault(key, [])
+        group.append((pair, image, ref))
+        waiting += 1
+        if len(group) >= batch_size:
+            waiting -= len(group)
+            yield _stack(groups.pop(key))
+        elif waiting > max_waiting:
+            key = max(groups, key=lambda k: len(groups[k]))
+            waiting -= len(groups[key])
+            yield _stack(groups.pop(key))
+    for group in groups.values():
+        yield _stack(group)
+
+
+def _stack(group: list):
+    pairs = [pair for pair, _, _ in group]
+    images = np.stack([image for _, image, _ in group])
+    refs = np.stack([ref for _, _, ref in group]) if group[0][2] is not None else None
+    return pairs, images, refs
+
+
+class MetricEngine:
+    """
+    Scores images in-process with pyiqa. Each metric model is created once with
+    pyiqa.create_metric and kept resident, so scoring many images only pays for
+    inference instead of a fresh Python/torch start and weight load per image.
+    With a ScoreCache, scores already computed for the same image content, metric
+    and pyiqa version are returned without running the model.
+
+    Metrics are given as specs: a pyiqa name, optionally with an input size
+    ('nima:224'). Each image is decoded, normalized and copied to the device once,
+    and that tensor is shared by every metric; only metrics with an input size get
+    a resized copy, made once per distinct size.
+    """
+
+    def __init__(self, device: str = 'cuda', num_threads: Optional[int] = None, cache: Optional[ScoreCache] = None):
+        import pyiqa
+        import torch
+
+        self.pyiqa = pyiqa
+        self.torch = torch
+        if num_threads:
+            self.set_num_threads(num_threads)
+        if device == 'cuda' and not torch.cuda.is_available():
+            print("Warning: CUDA is not available, using CPU.")
+            device = 'cpu'
+        self.device = torch.device(device)
+        self.metrics = {}
+        self.cache = cache
+        self.version = getattr(pyiqa, '__version__', 'unknown')
+        self.timings = Timings()
+
+    def get_metric(self, spec: str):
+        """Returns the resident model for a metric, creating it on first use."""
+        name, _ = split_metric(spec)
+        if name not in self.metrics:
+            print(f"Loading metric '{name}' on {self.device}...")
+            self.metrics[name] = self.pyiqa.create_metric(name, device=self.device)
+        return self.metrics[name]
+
+    def is_full_reference(self, spec: str) -> bool:
+        """True if the metric needs a reference image (FR), False for NR metrics."""
+        return getattr(self.get_metric(spec), 'metric_mode', 'NR') == 'FR'
+
+    def lower_better(self, spec: str) -> bool:
+        return bool(getattr(self.get_metric(spec), 'lower_better', False))
+
+    def cache_key(self, spec: str, image_path: str, ref_path: Optional[str] = None, options: str = '') -> Optional[CacheKey]:
+        """Score cache key for an image file (None without a cache). NR metrics ignore ref_path."""
+        if self.cache is None:
+            return None
+        name, _ = split_metric(spec)
+        if not self.is_full_reference(spec):
+            ref_path = None
+        return self.cache.key(image_path, ref_path, name, metric_options(spec, options), self.version)
+
+    def set_num_threads(self, num_threads: int):
+        """Number of CPU threads torch uses for inference."""
+        self.torch.set_num_threads(num_threads)
+
+    def _sync(self):
+        # CUDA work is queued; wait for it so the timings land on the right stage
+        if self.device.type == 'cuda':
+            self.torch.cuda.synchronize()
+
+    def _resize(self, tensor: 'torch.Tensor', size: int) -> 'torch.Tensor':
+        """Resize an NxCxHxW batch so its shorter side is size (antialiased bicubic)."""
+        height, width = tensor.shape[-2:]
+        scale = size / min(height, width)
+        if scale == 1:
+            return tensor
+        out_size = (max(1, round(height * scale)), max(1, round(width * scale)))
+        resized = self.torch.nn.functional.interpolate(tensor, size=out_size, mode='bicubic', align_corners=False, antialias=True)
+        return resized.clamp_(0, 1)
+
+    def score_arrays(self, wanted: Dict[str, List[int]], images: np.ndarray, refs: Optional[np.ndarray] = None) -> Dict[str, List[float]]:
+        """
+        Scores a decoded NxCxHxW batch (and matching references for FR metrics) with
+        several metrics. wanted maps each metric spec to the batch indices it should
+        score. Returns {metric: scores in index order}; a metric that fails is
+        reported and left out.
+        """
+        start = time.perf_counter()
+        target = self.torch.from_numpy(images).to(self.device)
+        ref = self.torch.from_numpy(refs).to(self.device) if refs is not None else None
+        self._sync()
+        self.timings.add('', 'to_device', time.perf_counter() - start, len(images))
+
+        inputs = {None: (target, ref)}
+        results = {}
+        with self.torch.no_grad():
+            for spec, index in wanted.items():
+                if not index:
+                    continue
+                try:
+                    metric = self.get_metric(spec)
+                    _, size = split_metric(spec)
+                    start = time.perf_counter()
+                    if size not in inputs:
+                        inputs[size] = (self._resize(target, size), self._resize(ref, size) if ref is not None else None)
+                    spec_target, spec_ref = inputs[size]
+                    if not self.is_full_reference(spec):
+                        spec_ref = None
+                    if len(index) < len(images):
+                        spec_target = spec_target[index]
+                        spec_ref = spec_ref[index] if spec_ref is not None else None
+                    self._sync()
+                    self.timings.add(spec, 'prep', time.perf_counter() - start, len(index))
+
+                    start = time.perf_counter()
+                    result = metric(spec_target) if spec_ref is None else metric(spec_target, spec_ref)
+                    results[spec] = [float(v) for v in result.flatten().tolist()]
+                    self.timings.add(spec, 'inference', time.perf_counter() - start, len(index))
+                except Exception as e:
+                    print(f"Error scoring {len(index)} image(s) with {spec}: {str(e)}")
+        return results
+
+    def score_many(self, names: List[str], image_path: str, ref_path: Optional[str] = None) -> Dict[str, float]:
+        """
+        Scores one image with several metrics, decoding it once; returns {metric: score}.
+        Cached scores are used where available; failures are reported and left out.
+        """
+        scores = {}
+        keys = {}
+        for spec in names:
+            key = self.cache_key(spec, image_path, ref_path)
+            cached = self.cache.get(key) if key is not None else None
+            if cached is None:
+                keys[spec] = key
+            else:
+                scores[spec] = cached
+
+        if keys:
+            start = time.perf_counter()
+            try:
+                image = load_image(image_path)
+                needs_ref = ref_path and any(self.is_full_reference(spec) for spec in keys)
+                ref = load_image(ref_path) if needs_ref else None
+            except Exception as e:
+                print(f"Error loading {image_path}: {str(e)}")
+                return scores
+            self.timings.add('', 'decode', time.perf_counter() - start)
+
+            results = self.score_arrays({spec: [0] for spec in keys}, image[None], ref[None] if ref is not None else None)
+            for spec, values in results.items():
+                scores[spec] = values[0]
+                if keys[spec] is not None:
+                    self.cache.put(keys[spec], values[0])
+            if self.cache is not None:
+                self.cache.commit()
+        return {spec: scores[spec] for spec in names if spec in scores}
+
+    def score_directory(self, names: List[str], dir_path: str, ref_dir: Optional[str] = None, batch_size: int = 8, workers: int = 4, crop_size: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, float]]]:
+        """
+        Score every image in dir_path with each metric, in batches decoded ahead on
+        background threads. With ref_dir, each image is paired with the same-named
+        reference for FR metrics. Yields (image path, {metric: score}) as batches
+        finish; a metric that fails on a batch is reported and left out of its scores.
+
+        The score cache is checked on the decode threads as images come up, so
+        hashing overlaps with inference. Images whose scores are all cached are
+        yielded without being decoded; the rest are only scored with the metrics
+        they are missing.
+        """
+        pairs = []
+        for image_path in list_images(dir_path):
+            ref_path = None
+            if ref_dir:
+                ref_path = os.path.join(ref_dir, os.path.basename(image_path))
+                if not os.path.exists(ref_path):
+                    print(f"Skipping {os.path.basename(image_path)}: no reference image found.")
+                    continue
+            pairs.append((image_path, ref_path))
+
+        options = f'crop={crop_size}' if crop_size else ''
+        known = {}
+        keys = {}
+        if self.cache is not None:
+            for spec in names:
+                # Load the models here, not on the decode threads that build cache keys
+                self.is_full_reference(spec)
+
+        def lookup(pair):
+            pair_keys, pair_known = {}, {}
+            for spec in names:
+                key = self.cache_key(spec, pair[0], pair[1], options)
+                cached = self.cache.get(key) if key is not None else None
+                if cached is None:
+                    pair_keys[spec] = key
+                else:
+                    pair_known[spec] = cached
+            keys[pair], known[pair] = pair_keys, pair_known
+            return bool(pair_keys)
+
+        for batch, images, refs in iter_batches(pairs, batch_size, workers, crop_size, self.timings, lookup):
+            if images is not None:
+                wanted = {spec: [i for i, pair in enumerate(batch) if spec in keys[pair]] for spec in names}
+                for spec, values in self.score_arrays(wanted, images, refs).items():
+                    for i, value in zip(wanted[spec], values):
+                        known[batch[i]][spec] = value
+                        if keys[batch[i]][spec] is not None:
+                            self.cache.put(keys[batch[i]][spec], value)
+                if self.cache is not None:
+                    self.cache.commit()
+            for pair in batch:
+                keys.pop(pair, None)
+                scores = known.pop(pair)
+                yield pair[0], {spec: scores[spec] for spec in names if spec in scores}
+
+    def list_metrics(self) -> List[str]:
+        return self.pyiqa.list_models()
@@ -0,0 +1,102 @@
+import os
+import csv
+import json
+from typing import Dict, Optional
+
+from metric_engine import metric_options, split_metric
+
+# One row per (image, metric, role); score is always a float. metric is the bare
+# pyiqa name and options holds its input size ('resize=224', empty for full
+# resolution). frame and time are only set for video frames.
+COLUMNS = ['image', 'reference', 'role', 'metric', 'options', 'score', 'frame', 'time']
+
+# Rows buffered per Parquet row group
+row_group_size = 50000
+
+
+def results_format(path: str) -> str:
+    """Output format from the file extension: parquet, jsonl, or csv for anything else."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return 'parquet'
+    if ext == '.jsonl':
+        return 'jsonl'
+    if ext == '.json':
+        # A .json file would be expected to hold one JSON document, not one per line
+        raise ValueError("JSON output is written as JSON Lines (one row per line); use a .jsonl extension.")
+    return 'csv'
+
+
+class ResultsWriter:
+    """
+    Streams score rows to CSV, JSON Lines or Parquet (needs pyarrow), picked from
+    the output file's extension. CSV and JSONL rows are written as they arrive;
+    Parquet rows are written in row groups of row_group_size, so memory stays
+    bounded however many scores a run produces.
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None):
+        self.path = path
+        self.format = fmt or results_format(path)
+        self.rows = 0
+        if self.format == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Parquet output needs pyarrow. You can install it using: pip install pyarrow")
+            self.pa = pyarrow
+            self.schema = pyarrow.schema([
+                ('image', pyarrow.string()),
+                ('reference', pyarrow.string()),
+                ('role', pyarrow.string()),
+                ('metric', pyarrow.string()),
+                ('options', pyarrow.string()),
+                ('score', pyarrow.float64()),
+                ('frame', pyarrow.int64()),
+                ('time', pyarrow.float64()),
+            ])
+            self.buffer = {name: [] for name in COLUMNS}
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+            if self.format == 'csv':
+                self.csv = csv.writer(self.file)
+                self.csv.writerow(COLUMNS)
+
+    def write(self, image: str, metric: str, score: float, role: str = '', reference: str = '', frame: Optional[int] = None, time: Optional[float] = None):
+        """Write one row; metric is a spec like 'nima:224', split into metric and options."""
+        row = [image, reference or '', role, split_metric(metric)[0], metric_options(metric), float(score), frame, time]
+        self.rows += 1
+        if self.format == 'parquet':
+            for name, value in zip(COLUMNS, row):
+                self.buffer[name].append(value)
+            if len(self.buffer['score']) >= row_group_size:
+                self._flush_row_group()
+        elif self.format == 'jsonl':
+            self.file.write(json.dumps(dict(zip(COLUMNS, row))) + '\n')
+        else:
+            self.csv.writerow(['' if value is None else value for value in row])
+
+    def write_scores(self, image: str, scores: Dict[str, float], role: str = '', reference: str = ''):
+        """Write one row per metric in scores."""
+        for metric, score in scores.items():
+            self.write(image, metric, score, role, reference)
+
+    def _flush_row_group(self):
+        if self.buffer['score']:
+            self.writer.write_table(self.pa.Table.from_pydict(self.buffer, schema=self.schema))
+            self.buffer = {name: [] for name in COLUMNS}
+
+    def close(self):
+        if self.format == 'parquet':
+            self._flush_row_group()
+            self.writer.close()
+        else:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
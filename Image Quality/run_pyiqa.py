@@ -1,13 +1,21 @@
 import os
+import shutil
 import subprocess
 import sys
-from typing import List, Optional
+import time
+from typing import Dict, List, Optional
 from pathlib import Path
-import csv
+
+from metric_engine import MetricEngine, list_images
+from results_writer import ResultsWriter
+from score_cache import ScoreCache
+from video_scoring import SAMPLING_MODES, score_video
 
 class PyIQAToolbox:
     def __init__(self):
         self.check_pyiqa_installation()
+        self.engines = {}
+        self.cache = ScoreCache()
 
     def check_pyiqa_installation(self):
         """Check if pyiqa is installed."""
@@ -71,6 +79,94 @@ class PyIQAToolbox:
             print(f"Unexpected error: {str(e)}")
             return None
 
+    def get_engine(self, device: str) -> Optional[MetricEngine]:
+        """Return the in-process metric engine for a device, creating it on first use."""
+        if device not in self.engines:
+            try:
+                self.engines[device] = MetricEngine(device, cache=self.cache)
+            except ImportError as e:
+                print(f"Error: could not import pyiqa/torch ({e}).")
+                print("You can install it using: pip install pyiqa")
+                return None
+        return self.engines[device]
+
+    def load_metrics(self, engine: MetricEngine, metrics: List[str]) -> bool:
+        """Create every requested metric up front so a bad name fails once, not per image."""
+        for metric in metrics:
+            try:
+                engine.get_metric(metric)
+            except Exception as e:
+                print(f"Error loading metric '{metric}': {str(e)}")
+                return False
+        return True
+
+    def score_image(self, engine: MetricEngine, metrics: List[str], image_path: str, ref_path: Optional[str] = None, verbose: bool = True) -> Dict[str, float]:
+        """Score one image with each metric, decoding it once; failed metrics are reported and left out."""
+        scores = engine.score_many(metrics, image_path, ref_path)
+        if verbose:
+            for metric, score in scores.items():
+                print(f"{metric} score of {os.path.basename(image_path)}: {score:.4f}")
+        return scores
+
+    def print_run_summary(self):
+        """Print per-metric timings and score cache stats for the action that just ran."""
+        for engine in self.engines.values():
+            engine.timings.print_summary()
+        self.cache.print_stats()
+
+    def prompt_batch_options(self) -> Optional[Dict[str, int]]:
+        """Ask for the batching options used by directory scoring."""
+        try:
+            batch_size = int(input("Enter batch size (default is 8): ") or 8)
+            workers = int(input("Enter decode threads (default is 4): ") or 4)
+            crop_size = int(input("Center-crop images to N pixels so mixed sizes batch together (optional): ") or 0)
+            num_threads = int(input("Enter CPU threads for inference (optional): ") or 0)
+        except ValueError:
+            print("Error: batch options must be whole numbers.")
+            return None
+        if batch_size < 1 or workers < 1:
+            print("Error: batch size and decode threads must be at least 1.")
+            return None
+        return {'batch_size': batch_size, 'workers': workers, 'crop_size': crop_size or None, 'num_threads': num_threads or None}
+
+    def score_directory(self, engine: MetricEngine, metrics: List[str], dir_path: str, ref_dir: Optional[str] = None, batch_size: int = 8, workers: int = 4, crop_size: Optional[int] = None, num_threads: Optional[int] = None, writer: Optional[ResultsWriter] = None, role: str = 'image'):
+        """
+        Score every image in a directory (against the same-named file in ref_dir for
+        FR metrics) in batches, decoding ahead on background threads, and print the
+        per-metric mean. With a writer, rows are streamed to it as batches finish,
+        so nothing is held per image.
+        """
+        if num_threads:
+            engine.set_num_threads(num_threads)
+        totals = {metric: [0.0, 0] for metric in metrics}
+        count = 0
+        start = time.perf_counter()
+        for image_path, scores in engine.score_directory(metrics, dir_path, ref_dir, batch_size, workers, crop_size):
+            count += 1
+            for metric, score in scores.items():
+                print(f"{metric} score of {os.path.basename(image_path)}: {score:.4f}")
+                totals[metric][0] += score
+                totals[metric][1] += 1
+            if writer:
+                reference = os.path.join(ref_dir, os.path.basename(image_path)) if ref_dir else ''
+                writer.write_scores(image_path, scores, role, reference)
+        elapsed = time.perf_counter() - start
+
+        print()
+        if count:
+            print(f"Scored {count} images in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.1f} images/s)")
+        for metric, (total, n) in totals.items():
+            if n:
+                print(f"{metric} mean over {n} images: {total / n:.4f}")
+
+    def open_writer(self, output_file: str) -> Optional[ResultsWriter]:
+        """Open a results writer for output_file, reporting (rather than raising) failures."""
+        try:
+            return ResultsWriter(output_file)
+        except Exception as e:
+            print(f"Error opening {output_file}: {str(e)}")
+            return None
+
     def list_metrics(self):
         """List all available metrics."""
         print()
@@ -90,8 +186,11 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
-        print()
-        self.run_command(['pyiqa', metric, '-t', image_path, '--device', device, '--verbose'])
+        engine = self.get_engine(device)
+        if engine and self.load_metrics(engine, [metric]):
+            print()
+            self.score_image(engine, [metric], image_path)
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def run_multiple_metrics_single_image(self):
@@ -107,8 +206,11 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
-        print()
-        self.run_command(['pyiqa'] + metrics + ['-t', image_path, '--device', device, '--verbose'])
+        engine = self.get_engine(device)
+        if engine and self.load_metrics(engine, metrics):
+            print()
+            self.score_image(engine, metrics, image_path)
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def run_single_metric_directory(self):
@@ -124,8 +226,16 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
-        print()
-        self.run_command(['pyiqa', metric, '-t', dir_path, '--device', device, '--verbose'])
+        batch_options = self.prompt_batch_options()
+        if batch_options is None:
+            input("\nPress Enter to continue...")
+            return
+
+        engine = self.get_engine(device)
+        if engine and self.load_metrics(engine, [metric]):
+            print()
+            self.score_directory(engine, [metric], dir_path, **batch_options)
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def run_multiple_metrics_directory(self):
@@ -141,8 +251,16 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
-        print()
-        self.run_command(['pyiqa'] + metrics + ['-t', dir_path, '--device', device, '--verbose'])
+        batch_options = self.prompt_batch_options()
+        if batch_options is None:
+            input("\nPress Enter to continue...")
+            return
+
+        engine = self.get_engine(device)
+        if engine and self.load_metrics(engine, metrics):
+            print()
+            self.score_directory(engine, metrics, dir_path, **batch_options)
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def compare_two_images(self):
@@ -160,8 +278,11 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
-        print()
-        self.run_command(['pyiqa', metric, '-t', test_image, '-r', ref_image, '--device', device, '--verbose'])
+        engine = self.get_engine(device)
+        if engine and self.load_metrics(engine, [metric]):
+            print()
+            self.score_image(engine, [metric], test_image, ref_image)
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def compare_two_directories(self):
@@ -179,8 +300,11 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
-        print()
-        self.run_command(['pyiqa', metric, '-t', test_dir, '-r', ref_dir, '--device', device, '--verbose'])
+        engine = self.get_engine(device)
+        if engine and self.load_metrics(engine, [metric]):
+            print()
+            self.score_directory(engine, [metric], test_dir, ref_dir)
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def compare_upscaled(self):
@@ -198,10 +322,13 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
-        print("\nResults for original image:")
-        self.run_command(['pyiqa'] + metrics + ['-t', original_image, '--device', device, '--verbose'])
-        print("\nResults for upscaled image:")
-        self.run_command(['pyiqa'] + metrics + ['-t', upscaled_image, '--device', device, '--verbose'])
+        engine = self.get_engine(device)
+        if engine and self.load_metrics(engine, metrics):
+            print("\nResults for original image:")
+            self.score_image(engine, metrics, original_image)
+            print("\nResults for upscaled image:")
+            self.score_image(engine, metrics, upscaled_image)
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def batch_compare_upscaled(self):
@@ -209,7 +336,7 @@ class PyIQAToolbox:
         metrics = input("Enter NR metric names separated by spaces: ").split()
         original_dir = input("Enter the path to the directory with original images: ")
         upscaled_dir = input("Enter the path to the directory with upscaled images: ")
-        output_file = input("Enter the output file name for results: ")
+        output_file = input("Enter the output file name for results (.csv, .jsonl or .parquet): ")
         
         if not all(self.validate_path(p) for p in [original_dir, upscaled_dir]):
             input("\nPress Enter to continue...")
@@ -220,25 +347,32 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
+        engine = self.get_engine(device)
+        if not engine or not self.load_metrics(engine, metrics):
+            input("\nPress Enter to continue...")
+            return
+
+        writer = self.open_writer(output_file)
+        if not writer:
+            input("\nPress Enter to continue...")
+            return
+
         print("\nProcessing...")
         try:
-            with open(output_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Filename', 'Original Score', 'Upscaled Score'])
-                
-                for filename in os.listdir(original_dir):
-                    original_path = os.path.join(original_dir, filename)
+            with writer:
+                for original_path in list_images(original_dir):
+                    filename = os.path.basename(original_path)
                     upscaled_path = os.path.join(upscaled_dir, filename)
                     
                     if os.path.exists(upscaled_path):
-                        original_score = self.run_command(['pyiqa'] + metrics + ['-t', original_path, '--device', device], capture_output=True)
-                        upscaled_score = self.run_command(['pyiqa'] + metrics + ['-t', upscaled_path, '--device', device], capture_output=True)
-                        writer.writerow([filename, original_score.strip(), upscaled_score.strip()])
+                        writer.write_scores(original_path, self.score_image(engine, metrics, original_path, verbose=False), 'original')
+                        writer.write_scores(upscaled_path, self.score_image(engine, metrics, upscaled_path, verbose=False), 'upscaled')
             
-            print(f"Results saved to {output_file}")
+            print(f"{writer.rows} results saved to {output_file}")
         except Exception as e:
             print(f"Error processing files: {str(e)}")
         
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def compare_upscaling_methods(self):
@@ -257,12 +391,15 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
-        print("\nResults for original image:")
-        self.run_command(['pyiqa'] + metrics + ['-t', original_image, '--device', device, '--verbose'])
-        print("\nResults for first upscaled image:")
-        self.run_command(['pyiqa'] + metrics + ['-t', upscaled_image1, '--device', device, '--verbose'])
-        print("\nResults for second upscaled image:")
-        self.run_command(['pyiqa'] + metrics + ['-t', upscaled_image2, '--device', device, '--verbose'])
+        engine = self.get_engine(device)
+        if engine and self.load_metrics(engine, metrics):
+            print("\nResults for original image:")
+            self.score_image(engine, metrics, original_image)
+            print("\nResults for first upscaled image:")
+            self.score_image(engine, metrics, upscaled_image1)
+            print("\nResults for second upscaled image:")
+            self.score_image(engine, metrics, upscaled_image2)
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def compare_multiple_upscaling_models(self):
@@ -270,7 +407,7 @@ class PyIQAToolbox:
         metrics = input("Enter metric names separated by spaces: ").split()
         original_image = input("Enter the path to the original image: ")
         upscaled_dir = input("Enter the path to the directory containing upscaled images: ")
-        output_file = input("Enter the output file name for results (e.g., results.csv): ")
+        output_file = input("Enter the output file name for results (e.g., results.csv, .jsonl or .parquet): ")
         
         if not all(self.validate_path(p) for p in [original_image, upscaled_dir]):
             input("\nPress Enter to continue...")
@@ -281,28 +418,37 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
+        engine = self.get_engine(device)
+        if not engine or not self.load_metrics(engine, metrics):
+            input("\nPress Enter to continue...")
+            return
+
+        writer = self.open_writer(output_file)
+        if not writer:
+            input("\nPress Enter to continue...")
+            return
+
         print("\nProcessing...")
         try:
-            with open(output_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Model', 'Score'])
-                
+            with writer:
+                print(f"{'Model':<32}" + ''.join(f"{m:>12}" for m in metrics))
+
                 # Original image score
-                original_score = self.run_command(['pyiqa'] + metrics + ['-t', original_image, '--device', device], capture_output=True)
-                writer.writerow(['Original', original_score.strip()])
+                scores = self.score_image(engine, metrics, original_image, verbose=False)
+                writer.write_scores(original_image, scores, 'original')
+                print(f"{'Original':<32}" + ''.join(f"{scores[m]:>12.4f}" if m in scores else f"{'-':>12}" for m in metrics))
                 
                 # Upscaled images scores
-                for filename in os.listdir(upscaled_dir):
-                    upscaled_path = os.path.join(upscaled_dir, filename)
-                    score = self.run_command(['pyiqa'] + metrics + ['-t', upscaled_path, '--device', device], capture_output=True)
-                    writer.writerow([filename, score.strip()])
+                for upscaled_path in list_images(upscaled_dir):
+                    scores = self.score_image(engine, metrics, upscaled_path, verbose=False)
+                    writer.write_scores(upscaled_path, scores, 'model')
+                    print(f"{os.path.basename(upscaled_path):<32}" + ''.join(f"{scores[m]:>12.4f}" if m in scores else f"{'-':>12}" for m in metrics))
             
-            print(f"Results saved to {output_file}")
-            with open(output_file, 'r') as f:
-                print(f.read())
+            print(f"\n{writer.rows} results saved to {output_file}")
         except Exception as e:
             print(f"Error processing files: {str(e)}")
         
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def run_fid_metric(self):
@@ -352,36 +498,85 @@ class PyIQAToolbox:
 
     def run_metrics_on_video(self):
         """Run metrics on video."""
-        metric = input("Enter the metric name: ")
+        metrics = input("Enter NR metric names separated by spaces: ").split()
         video_path = input("Enter the path to the video file: ")
-        output_file = input("Enter the output file name for results: ")
+        output_file = input("Enter the output file name for per-frame results (.csv, .jsonl or .parquet, optional): ")
         
         if not self.validate_path(video_path):
             input("\nPress Enter to continue...")
             return
+
+        missing = [tool for tool in ('ffmpeg', 'ffprobe') if shutil.which(tool) is None]
+        if missing:
+            print(f"Error: {' and '.join(missing)} not found. Install ffmpeg and make sure it is on PATH.")
+            input("\nPress Enter to continue...")
+            return
+
+        mode = input(f"Enter frame sampling ({', '.join(SAMPLING_MODES)}, default is stride): ") or "stride"
+        try:
+            sampling = {'mode': mode}
+            if mode == 'stride':
+                sampling['stride'] = int(input("Score every Nth frame (default is 10): ") or 10)
+            elif mode == 'scene':
+                sampling['threshold'] = float(input("Enter scene change threshold 0-1 (default is 0.3): ") or 0.3)
+            elif mode != 'keyframes':
+                raise ValueError(f"unknown sampling mode '{mode}'")
+            sampling['short_side'] = int(input("Downscale frames to N pixels on the shorter side (optional): ") or 0) or None
+            batch_size = int(input("Enter batch size (default is 8): ") or 8)
+            segment_seconds = float(input("Enter segment length in seconds for worst segments (default is 5): ") or 5)
+        except ValueError as e:
+            print(f"Error: invalid video option ({str(e)}).")
+            input("\nPress Enter to continue...")
+            return
+        if sampling.get('stride', 1) < 1 or batch_size < 1 or segment_seconds <= 0:
+            print("Error: stride, batch size and segment length must be positive.")
+            input("\nPress Enter to continue...")
+            return
             
         device = input("Enter device (cuda or cpu, default is cuda): ") or "cuda"
         if not self.validate_device(device):
             input("\nPress Enter to continue...")
             return
+
+        engine = self.get_engine(device)
+        if not engine or not self.load_metrics(engine, metrics):
+            input("\nPress Enter to continue...")
+            return
+        full_reference = [metric for metric in metrics if engine.is_full_reference(metric)]
+        if full_reference:
+            print(f"Error: FR metrics need a reference image and can't score video: {', '.join(full_reference)}")
+            input("\nPress Enter to continue...")
+            return
+
+        writer = None
+        if output_file:
+            writer = self.open_writer(output_file)
+            if not writer:
+                input("\nPress Enter to continue...")
+                return
         
         print("\nProcessing video...")
         try:
-            result = self.run_command(['pyiqa', metric, '-t', video_path, '--device', device, '--verbose'], capture_output=True)
-            if result:
-                with open(output_file, 'w') as f:
-                    f.write(result)
-                print(f"Results saved to {output_file}")
+            stats = score_video(engine, metrics, video_path, writer, batch_size, segment_seconds, **sampling)
+            print()
+            for metric, metric_stats in stats.items():
+                metric_stats.print_summary(metric)
+            if writer:
+                print(f"{writer.rows} results saved to {output_file}")
         except Exception as e:
             print(f"Error processing video: {str(e)}")
+        finally:
+            if writer:
+                writer.close()
         
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def save_results(self):
         """Save results to a file."""
         metrics = input("Enter metric names separated by spaces: ").split()
         dir_path = input("Enter the path to the directory: ")
-        output_file = input("Enter the output file name: ")
+        output_file = input("Enter the output file name (.csv, .jsonl or .parquet): ")
         
         if not self.validate_path(dir_path):
             input("\nPress Enter to continue...")
@@ -392,16 +587,25 @@ class PyIQAToolbox:
             input("\nPress Enter to continue...")
             return
         
+        engine = self.get_engine(device)
+        if not engine or not self.load_metrics(engine, metrics):
+            input("\nPress Enter to continue...")
+            return
+
+        writer = self.open_writer(output_file)
+        if not writer:
+            input("\nPress Enter to continue...")
+            return
+
         print()
         try:
-            result = self.run_command(['pyiqa'] + metrics + ['-t', dir_path, '--device', device, '--verbose'], capture_output=True)
-            if result:
-                with open(output_file, 'w') as f:
-                    f.write(result)
-                print(f"Results saved to {output_file}")
+            with writer:
+                self.score_directory(engine, metrics, dir_path, writer=writer)
+            print(f"{writer.rows} results saved to {output_file}")
         except Exception as e:
             print(f"Error saving results: {str(e)}")
         
+        self.print_run_summary()
         input("\nPress Enter to continue...")
 
     def handle_info_command(self, option: str):
@@ -420,6 +624,7 @@ class PyIQAToolbox:
                 continue
 
             if choice == '16':
+                self.cache.close()
                 break
 
             # Map choices to methods
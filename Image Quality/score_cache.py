@@ -0,0 +1,101 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+# Default cache file, kept next to the toolbox scripts
+default_cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'score_cache.sqlite')
+
+CacheKey = Tuple[str, str, str, str, str]
+
+
+class ScoreCache:
+    """
+    Persistent metric scores in SQLite, keyed by (image content hash, reference
+    content hash, metric name, metric options, pyiqa version). Renaming or copying
+    an image keeps its scores; editing it, changing the options or upgrading pyiqa
+    does not.
+
+    Content hashes are remembered per (path, size, mtime), so unchanged files are
+    not re-read on later runs. The cache can be shared by threads: database access
+    is serialized, while files are hashed in parallel.
+    """
+
+    def __init__(self, path: str = default_cache_path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS scores ('
+            'content_hash TEXT, ref_hash TEXT, metric TEXT, options TEXT, version TEXT, score REAL, '
+            'PRIMARY KEY (content_hash, ref_hash, metric, options, version))'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT)'
+        )
+        self.conn.commit()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def file_hash(self, path: str) -> str:
+        """SHA-256 of a file's content, reusing the stored hash if the file is unchanged."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.conn.execute('SELECT size, mtime_ns, content_hash FROM files WHERE path = ?', (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (path, stat.st_size, stat.st_mtime_ns, content_hash)
+            )
+        return content_hash
+
+    def key(self, image_path: str, ref_path: Optional[str], metric: str, options: str, version: str) -> CacheKey:
+        ref_hash = self.file_hash(ref_path) if ref_path else ''
+        return (self.file_hash(image_path), ref_hash, metric, options, version)
+
+    def get(self, key: CacheKey) -> Optional[float]:
+        """Cached score for key, or None; counts a hit or a miss."""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT score FROM scores WHERE content_hash = ? AND ref_hash = ? AND metric = ? AND options = ? AND version = ?',
+                key,
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: CacheKey, score: float):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)', key + (score,))
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def print_stats(self):
+        """Print and reset the hit/miss counts since the last call."""
+        total = self.hits + self.misses
+        if total:
+            print(f"Score cache: {self.hits} hits, {self.misses} misses ({self.hits / total:.0%} hit rate)")
+        self.reset_stats()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
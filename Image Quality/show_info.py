@@ -81,8 +81,8 @@ def show_info(option):
         14: {
             "title": "Run metrics on video",
             "use_case": "When you want to evaluate the quality of a video file.",
-            "description": "This option extends image quality assessment to video, allowing for frame-by-frame analysis.",
-            "note": "Ideal for video processing tasks where quality consistency is important."
+            "description": "This option extends image quality assessment to video, allowing for frame-by-frame analysis. Frames are streamed from ffmpeg and sampled every Nth frame, at keyframes only, or at scene changes.",
+            "note": "Ideal for video processing tasks where quality consistency is important. Reports the mean, the 5% tail and the worst segments, and can save per-frame scores. Needs ffmpeg and ffprobe on PATH."
         },
         15: {
             "title": "Save results to a file",
@@ -0,0 +1,317 @@
+import re
+import json
+import time
+import heapq
+import queue
+import threading
+import subprocess
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from metric_engine import MetricEngine
+from results_writer import ResultsWriter
+
+SAMPLING_MODES = ('stride', 'keyframes', 'scene')
+
+# showinfo log line for each frame leaving the filter graph
+_showinfo_line = re.compile(r'\bn:\s*(\d+)\s+pts:\s*(-?\d+)\s+pts_time:\s*(-?[0-9.eE+-]+)')
+
+
+def probe_video(path: str, ffprobe: str = 'ffprobe') -> Dict[str, float]:
+    """Width, height, frame rate and start time (seconds) of the first video stream, via ffprobe."""
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate,start_time', '-of', 'json', path],
+        capture_output=True, text=True, check=True,
+    )
+    streams = json.loads(result.stdout).get('streams')
+    if not streams:
+        raise ValueError(f"No video stream found in '{path}'.")
+    stream = streams[0]
+    fps = 0.0
+    for key in ('avg_frame_rate', 'r_frame_rate'):
+        num, _, den = stream.get(key, '0/0').partition('/')
+        if float(den or 1) and float(num):
+            fps = float(num) / float(den or 1)
+            break
+    try:
+        start_time = float(stream.get('start_time', 0))
+    except ValueError:  # 'N/A'
+        start_time = 0.0
+    return {'width': int(stream['width']), 'height': int(stream['height']), 'fps': fps, 'start_time': start_time}
+
+
+def output_size(width: int, height: int, short_side: Optional[int] = None) -> Tuple[int, int]:
+    """Frame size after scaling the shorter side to short_side (never upscaling)."""
+    if not short_side or short_side >= min(width, height):
+        return width, height
+    scale = short_side / min(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def ffmpeg_command(path: str, size: Tuple[int, int], mode: str = 'stride', stride: int = 10, threshold: float = 0.3, ffmpeg: str = 'ffmpeg') -> List[str]:
+    """
+    ffmpeg decoding only the sampled frames of path as raw rgb24 on stdout, with a
+    showinfo line per frame on stderr for its timestamp. Timestamps are kept as
+    stored (-copyts), so they are offset by the stream's start time.
+
+    stride keeps every stride-th frame; keyframes has the decoder skip everything
+    but keyframes (the cheapest mode); scene keeps the first frame and each frame
+    whose scene-change score exceeds threshold.
+    """
+    filters = []
+    if mode == 'stride' and stride > 1:
+        filters.append(f'select=not(mod(n\\,{stride}))')
+    elif mode == 'scene':
+        filters.append(f'select=eq(n\\,0)+gt(scene\\,{threshold})')
+    filters.append(f'scale={size[0]}:{size[1]}:flags=bicubic')
+    filters.append('showinfo')
+
+    command = [ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'info']
+    if mode == 'keyframes':
+        command += ['-skip_frame', 'nokey']
+    command += ['-copyts', '-noautorotate', '-i', path, '-an', '-sn', '-vf', ','.join(filters)]
+    command += ['-fps_mode', 'passthrough', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    return command
+
+
+def iter_frames(path: str, mode: str = 'stride', stride: int = 10, threshold: float = 0.3, short_side: Optional[int] = None, ffmpeg: str = 'ffmpeg', ffprobe: str = 'ffprobe') -> Iterator[Tuple[int, Optional[float], np.ndarray]]:
+    """
+    Yield (frame index, time in seconds, HxWx3 uint8 frame) for each sampled frame,
+    read one at a time from an ffmpeg pipe so memory doesn't grow with the video.
+    Index and time count from the stream's first frame, whatever its start time.
+    """
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode '{mode}', expected one of {', '.join(SAMPLING_MODES)}.")
+    info = probe_video(path, ffprobe)
+    size = output_size(info['width'], info['height'], short_side)
+    frame_bytes = size[0] * size[1] * 3
+
+    times = queue.Queue()
+    log_tail = deque(maxlen=20)
+
+    def read_stderr(stream):
+        for line in iter(stream.readline, b''):
+            text = line.decode(errors='replace')
+            match = _showinfo_line.search(text)
+            if match:
+                times.put(float(match.group(3)))
+            else:
+                log_tail.append(text.rstrip())
+        times.put(None)
+
+    process = subprocess.Popen(ffmpeg_command(path, size, mode, stride, threshold, ffmpeg), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    reader = threading.Thread(target=read_stderr, args=(process.stderr,), daemon=True)
+    reader.start()
+    count = 0
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                finished = True
+                break
+            try:
+                # showinfo logs each frame before it is written to stdout
+                frame_time = times.get(timeout=10)
+            except queue.Empty:
+                frame_time = None
+            if frame_time is not None:
+                frame_time = max(0.0, frame_time - info['start_time'])
+            if frame_time is not None and info['fps']:
+                index = round(frame_time * info['fps'])
+            else:
+                index = count * stride if mode == 'stride' else count
+            yield index, frame_time, np.frombuffer(data, dtype=np.uint8).reshape(size[1], size[0], 3)
+            count += 1
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+        reader.join(timeout=5)
+    if finished and process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed after {count} frames: {' / '.join(log_tail) or process.returncode}")
+
+
+class StreamingQuantile:
+    """
+    One quantile in bounded memory: exact (interpolated like np.quantile) while at
+    most exact_limit values have arrived, then estimated from a compactor sketch
+    (Manku, Rajagopalan and Lindsay, 1998). Values are kept in levels of at most
+    exact_limit items, an item on level h standing for 2**h values; a full level is
+    sorted and every other item is promoted to the next one. Each promotion from
+    level h moves any rank by at most 2**h, so rank_error() is a hard bound on how
+    far the estimate's rank is from p (about log2(n / exact_limit) / exact_limit as
+    a fraction of n, with no assumption about the order the values arrive in).
+    """
+
+    def __init__(self, p: float, exact_limit: int = 2000):
+        self.p = p
+        self.exact_limit = max(2, exact_limit)
+        self.levels = [[]]
+        self.count = 0
+        self.error = 0  # bound on the rank error, in values
+        self.compactions = 0
+
+    def add(self, x: float):
+        self.count += 1
+        self.levels[0].append(x)
+        level = 0
+        while len(self.levels[level]) > self.exact_limit:
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items = sorted(self.levels[level])
+            # Alternate which half is kept so the rank errors don't all lean one way
+            self.levels[level + 1].extend(items[self.compactions % 2::2])
+            self.levels[level] = []
+            self.compactions += 1
+            self.error += 2 ** level
+            level += 1
+
+    @property
+    def exact(self) -> bool:
+        return self.error == 0
+
+    def rank_error(self) -> float:
+        """Bound on the estimate's rank error as a fraction of the values added."""
+        return self.error / self.count if self.count else 0.0
+
+    def value(self) -> Optional[float]:
+        if not self.count:
+            return None
+        if self.exact:
+            values = sorted(self.levels[0])
+            position = (len(values) - 1) * self.p
+            low = int(position)
+            high = min(low + 1, len(values) - 1)
+            return values[low] + (values[high] - values[low]) * (position - low)
+        items = sorted((x, 2 ** h) for h, level in enumerate(self.levels) for x in level)
+        target = self.p * sum(weight for _, weight in items)
+        seen = 0
+        for x, weight in items:
+            seen += weight
+            if seen > target:
+                return x
+        return items[-1][0]
+
+
+class VideoStats:
+    """
+    Running aggregates for one metric over a video: mean, worst frame, the 5th
+    percentile on the bad side (p95 for lower-is-better metrics), and the
+    worst_count segments of segment_seconds with the worst mean score.
+    """
+
+    def __init__(self, lower_better: bool = False, segment_seconds: float = 5.0, worst_count: int = 3):
+        self.lower_better = lower_better
+        self.segment_seconds = segment_seconds
+        self.worst_count = worst_count
+        self.count = 0
+        self.total = 0.0
+        self.worst = None
+        self.worst_frame = None
+        self.tail = StreamingQuantile(0.95 if lower_better else 0.05)
+        self.segment = None
+        self.segment_total = 0.0
+        self.segment_count = 0
+        self.worst_segments = []  # min-heap of (badness, start seconds, mean)
+
+    def _badness(self, score: float) -> float:
+        return score if self.lower_better else -score
+
+    def add(self, score: float, frame: int, frame_time: Optional[float]):
+        self.count += 1
+        self.total += score
+        self.tail.add(score)
+        if self.worst is None or self._badness(score) > self._badness(self.worst):
+            self.worst = score
+            self.worst_frame = frame
+        if frame_time is None:
+            return
+        segment = int(frame_time // self.segment_seconds)
+        if segment != self.segment:
+            self._close_segment()
+            self.segment = segment
+        self.segment_total += score
+        self.segment_count += 1
+
+    def _close_segment(self):
+        if self.segment_count:
+            mean = self.segment_total / self.segment_count
+            entry = (self._badness(mean), self.segment * self.segment_seconds, mean)
+            if len(self.worst_segments) < self.worst_count:
+                heapq.heappush(self.worst_segments, entry)
+            else:
+                heapq.heappushpop(self.worst_segments, entry)
+        self.segment_total = 0.0
+        self.segment_count = 0
+
+    def finish(self):
+        """Close the last segment; call once all frames are added."""
+        self._close_segment()
+        self.segment = None
+
+    def print_summary(self, metric: str):
+        if not self.count:
+            print(f"{metric}: no frames scored")
+            return
+        tail_label = 'p95' if self.lower_better else 'p5'
+        direction = 'lower is better' if self.lower_better else 'higher is better'
+        tail = f"{tail_label} {self.tail.value():.4f}"
+        if not self.tail.exact:
+            tail += f" (estimated, rank within ±{100 * self.tail.rank_error():.2f}%)"
+        print(f"{metric} over {self.count} frames ({direction}): mean {self.total / self.count:.4f}, "
+              f"{tail}, worst {self.worst:.4f} (frame {self.worst_frame})")
+        for _, start, mean in sorted(self.worst_segments, reverse=True):
+            print(f"  worst segment {format_time(start)}-{format_time(start + self.segment_seconds)}: mean {mean:.4f}")
+
+
+def format_time(seconds: float) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes):02d}:{seconds:04.1f}"
+
+
+def score_video(engine: MetricEngine, metrics: List[str], path: str, writer: Optional[ResultsWriter] = None, batch_size: int = 8, segment_seconds: float = 5.0, **sampling) -> Dict[str, VideoStats]:
+    """
+    Score the sampled frames of a video with each (NR) metric, batch_size frames per
+    inference call through the engine's resident models. Per-frame scores are
+    streamed to writer; only the running aggregates are kept, so memory is constant
+    in the video's length. sampling is passed to iter_frames (mode, stride,
+    threshold, short_side, ffmpeg, ffprobe). Returns {metric: VideoStats}.
+    """
+    stats = {metric: VideoStats(engine.lower_better(metric), segment_seconds) for metric in metrics}
+    batch = []
+
+    def flush():
+        normalize_start = time.perf_counter()
+        images = np.stack([frame for _, _, frame in batch]).transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        engine.timings.add('', 'decode', time.perf_counter() - normalize_start, 0)
+        results = engine.score_arrays({metric: list(range(len(batch))) for metric in metrics}, images)
+        for metric, values in results.items():
+            for (index, frame_time, _), score in zip(batch, values):
+                stats[metric].add(score, index, frame_time)
+                if writer:
+                    writer.write(path, metric, score, 'frame', frame=index, time=frame_time)
+        batch.clear()
+
+    frames = 0
+    start = time.perf_counter()
+    read_start = start
+    for index, frame_time, frame in iter_frames(path, **sampling):
+        engine.timings.add('', 'decode', time.perf_counter() - read_start)
+        batch.append((index, frame_time, frame))
+        frames += 1
+        if len(batch) >= batch_size:
+            flush()
+            print(f"\r{frames} frames scored", end='', flush=True)
+        read_start = time.perf_counter()
+    if batch:
+        flush()
+    elapsed = time.perf_counter() - start
+    print(f"\r{frames} frames scored in {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.1f} frames/s)")
+
+    for metric_stats in stats.values():
+        metric_stats.finish()
+    return stats
@@ -0,0 +1,122 @@
+import PIL
+from PIL import Image
+
+# Every backend, in the order they are listed and benchmarked
+backend_names = ("pillow-simd", "pyvips", "opencv", "pillow")
+
+# Preference order for backend="auto": the first one that is installed wins.
+# OpenCV is left out: its Lanczos doesn't antialias large downscales, so picking it
+# automatically would quietly lower output quality
+auto_order = ("pillow-simd", "pyvips", "pillow")
+
+# Modes every backend can hand over as 8-bit interleaved pixels
+_byte_modes = {"L": 1, "RGB": 3, "RGBA": 4}
+
+
+class PillowBackend:
+    """Pillow's own LANCZOS resize. Always available; also the fallback."""
+
+    name = "pillow"
+
+    @staticmethod
+    def available():
+        return True
+
+    def resize(self, img, size):
+        return img.resize(size, Image.Resampling.LANCZOS)
+
+
+class PillowSIMDBackend(PillowBackend):
+    """
+    Pillow-SIMD is a drop-in fork of Pillow, so the API is the same; it's only
+    listed separately so it can be picked (and reported) when it is installed.
+    """
+
+    name = "pillow-simd"
+
+    @staticmethod
+    def available():
+        return ".post" in PIL.__version__
+
+
+class OpenCVBackend:
+    """
+    OpenCV INTER_LANCZOS4. Note that OpenCV keeps a fixed 8x8 kernel when
+    downscaling, so large reductions alias more than Pillow's LANCZOS.
+    """
+
+    name = "opencv"
+
+    @staticmethod
+    def available():
+        try:
+            import cv2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def resize(self, img, size):
+        if img.mode not in _byte_modes:
+            return PillowBackend().resize(img, size)
+        import cv2
+        import numpy as np
+
+        resized = cv2.resize(np.asarray(img), size, interpolation=cv2.INTER_LANCZOS4)
+        return Image.fromarray(resized)
+
+
+class VipsBackend:
+    """libvips via pyvips: antialiased lanczos3, threaded internally."""
+
+    name = "pyvips"
+
+    @staticmethod
+    def available():
+        try:
+            import pyvips  # noqa: F401
+        except (ImportError, OSError):
+            return False
+        return True
+
+    def resize(self, img, size):
+        if img.mode not in _byte_modes:
+            return PillowBackend().resize(img, size)
+        import pyvips
+
+        width, height = img.size
+        vips_img = pyvips.Image.new_from_memory(
+            img.tobytes(), width, height, _byte_modes[img.mode], "uchar"
+        )
+        resized = vips_img.thumbnail_image(size[0], height=size[1], size="force")
+        return Image.frombytes(img.mode, size, resized.write_to_memory())
+
+
+backend_classes = {
+    cls.name: cls
+    for cls in (PillowBackend, PillowSIMDBackend, OpenCVBackend, VipsBackend)
+}
+
+_backend_cache = {}
+
+
+def available_backends():
+    """Names of the backends usable in this environment, in backend_names order."""
+    return [name for name in backend_names if backend_classes[name].available()]
+
+
+def get_backend(name="pillow"):
+    """
+    Returns a backend instance with a resize(img, size) method. "auto" picks the
+    first installed backend in auto_order; unknown or missing backends fall back to
+    Pillow.
+    """
+    if name not in _backend_cache:
+        if name == "auto":
+            name_found = next(n for n in auto_order if backend_classes[n].available())
+        elif name in backend_classes and backend_classes[name].available():
+            name_found = name
+        else:
+            print(f"Warning: resize backend '{name}' is not available. Using Pillow.")
+            name_found = "pillow"
+        _backend_cache[name] = backend_classes[name_found]()
+    return _backend_cache[name]
@@ -0,0 +1,76 @@
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from backends import available_backends, get_backend
+
+
+def synthetic_corpus(count, seed=0):
+    """Deterministic in-memory images of mixed sizes, with and without alpha."""
+    rng = np.random.default_rng(seed)
+    sizes = [(7680, 4320), (3840, 2160), (2560, 1440), (4000, 3000)]
+    images = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+        r = 127 + 100 * np.sin(x / (17.0 + i)) * np.cos(y / 23.0)
+        g = 127 + 100 * np.sin((x + y) / 61.0)
+        b = rng.integers(0, 256, (height, width)).astype(np.float32)
+        channels = [r, g, b]
+        if i % 3 == 2:
+            channels.append(np.full((height, width), 200, dtype=np.float32))
+        data = np.stack(channels, axis=-1).clip(0, 255).astype(np.uint8)
+        images.append(Image.fromarray(data))
+    return images
+
+
+def target_size(size, max_width=1920, max_height=1080):
+    """Same fit-within calculation as resize_single_image."""
+    width, height = size
+    scale = min(max_width / width, max_height / height)
+    return int(width * scale), int(height * scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the installed resize backends against Pillow."
+    )
+    parser.add_argument("--count", type=int, default=8, help="Number of images.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    images = synthetic_corpus(args.count)
+    megapixels = sum(img.width * img.height for img in images) / 1e6
+    reference = [
+        np.asarray(get_backend("pillow").resize(img, target_size(img.size)))
+        for img in images
+    ]
+
+    print(f"{args.count} images, {megapixels:.0f} MP total -> fit within 1920x1080")
+    print(
+        f"{'backend':<14}{'images/s':>10}{'MP/s':>10}{'mean diff':>11}{'max diff':>10}"
+    )
+    for name in available_backends():
+        backend = get_backend(name)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            outputs = [backend.resize(img, target_size(img.size)) for img in images]
+            best = min(best, time.perf_counter() - start)
+
+        diffs = [
+            np.abs(np.asarray(out, dtype=np.int16) - ref)
+            for out, ref in zip(outputs, reference)
+        ]
+        mean_diff = np.mean([d.mean() for d in diffs])
+        max_diff = max(int(d.max()) for d in diffs)
+        print(
+            f"{name:<14}{args.count / best:>10.2f}{megapixels / best:>10.0f}"
+            f"{mean_diff:>11.3f}{max_diff:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
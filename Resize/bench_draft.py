@@ -0,0 +1,104 @@
+import os
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from resize_single import resize_single_image
+
+
+def make_synthetic_jpeg(path, width, height, seed=0):
+    """Writes a deterministic JPEG with smooth gradients plus fine detail."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    r = 127 + 100 * np.sin(x / 37.0) * np.cos(y / 53.0)
+    g = 127 + 100 * np.sin((x + y) / 91.0)
+    b = 127 + 60 * np.cos(np.hypot(x - width / 2, y - height / 2) / 29.0)
+    img = np.stack([r, g, b], axis=-1) + rng.normal(0, 12, (height, width, 3))
+    Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(path, quality=95)
+
+
+def psnr(a_path, b_path):
+    """PSNR in dB between two images of the same size."""
+    a = np.asarray(Image.open(a_path).convert("RGB"), dtype=np.float64)
+    b = np.asarray(Image.open(b_path).convert("RGB"), dtype=np.float64)
+    mse = np.mean((a - b) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0**2 / mse)
+
+
+def time_resize(image_paths, output_dir, repeat, **kwargs):
+    """Best-of-repeat wall time for resizing all images, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in image_paths:
+            resize_single_image(path, output_dir, verbose=False, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare full JPEG decoding with draft (reduced-size) decoding."
+    )
+    parser.add_argument("--count", type=int, default=4, help="Number of test images.")
+    parser.add_argument("--width", type=int, default=7680)
+    parser.add_argument("--height", type=int, default=4320)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--tolerances",
+        type=float,
+        nargs="+",
+        default=[1.0, 2.0, 4.0],
+        help="draft_tolerance values to try.",
+    )
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_draft_")
+    try:
+        input_dir = os.path.join(work_dir, "in")
+        os.makedirs(input_dir)
+        image_paths = []
+        for i in range(args.count):
+            path = os.path.join(input_dir, f"synthetic_{i}.jpg")
+            make_synthetic_jpeg(path, args.width, args.height, seed=i)
+            image_paths.append(path)
+
+        full_dir = os.path.join(work_dir, "full")
+        os.makedirs(full_dir)
+        full_time = time_resize(image_paths, full_dir, args.repeat)
+        print(f"{args.count} x {args.width}x{args.height} JPEG -> 1920x1080")
+        print(f"{'mode':<16}{'time (s)':>10}{'speedup':>10}{'min PSNR':>12}")
+        print(f"{'full decode':<16}{full_time:>10.3f}{1.0:>10.2f}{'ref':>12}")
+
+        for tolerance in args.tolerances:
+            draft_dir = os.path.join(work_dir, f"draft_{tolerance}")
+            os.makedirs(draft_dir)
+            draft_time = time_resize(
+                image_paths,
+                draft_dir,
+                args.repeat,
+                draft=True,
+                draft_tolerance=tolerance,
+            )
+            scores = [
+                psnr(
+                    os.path.join(full_dir, os.path.basename(p)),
+                    os.path.join(draft_dir, os.path.basename(p)),
+                )
+                for p in image_paths
+            ]
+            label = f"draft tol={tolerance:g}"
+            print(
+                f"{label:<16}{draft_time:>10.3f}{full_time / draft_time:>10.2f}"
+                f"{min(scores):>12.2f}"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from resize_single import resize_single_image
+from resize_pair import process_pair
+
+# (width, height) cycle for the corpus: a mix of images that need resizing and
+# images that are already small enough to be copied
+corpus_sizes = [(3840, 2160), (1280, 720), (2560, 1440), (4000, 3000), (1920, 1080)]
+corpus_formats = [".png", ".jpg", ".webp", ".bmp"]
+
+
+def _read_corpus_spec(corpus_dir):
+    """The spec of a corpus written by make_corpus in corpus_dir, or None."""
+    try:
+        with open(os.path.join(corpus_dir, "corpus.json")) as f:
+            spec = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(spec, dict) or set(spec) != {"count", "seed", "sizes", "formats"}:
+        return None
+    return spec
+
+
+def make_corpus(corpus_dir, count, seed=0):
+    """
+    Writes a deterministic HQ/LQ corpus to corpus_dir/hq and corpus_dir/lq (LQ is HQ
+    at 1/4 scale) and returns its spec. An existing corpus with the same spec is
+    reused, so repeated runs and runs on different commits read identical inputs.
+
+    The corpus is built in a temporary directory next to corpus_dir and renamed into
+    place once complete, so an interrupted run leaves nothing half written. An
+    existing corpus_dir is only replaced if it holds a corpus made by this tool;
+    any other non-empty directory raises ValueError rather than being deleted.
+    """
+    spec = {
+        "count": count,
+        "seed": seed,
+        "sizes": corpus_sizes,
+        "formats": corpus_formats,
+    }
+    existing = _read_corpus_spec(corpus_dir)
+    if existing == json.loads(json.dumps(spec)):
+        return spec
+    if existing is None and os.path.isdir(corpus_dir) and os.listdir(corpus_dir):
+        raise ValueError(
+            f"{corpus_dir} is not empty and holds no bench_resize corpus; "
+            "remove it or pass another --corpus-dir."
+        )
+
+    parent = os.path.dirname(os.path.abspath(corpus_dir))
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=".corpus_build_", dir=parent)
+    try:
+        hq_dir = os.path.join(build_dir, "hq")
+        lq_dir = os.path.join(build_dir, "lq")
+        os.makedirs(hq_dir)
+        os.makedirs(lq_dir)
+        rng = np.random.default_rng(seed)
+        for i in range(count):
+            width, height = corpus_sizes[i % len(corpus_sizes)]
+            ext = corpus_formats[i % len(corpus_formats)]
+            # Every third image gets an alpha channel, in a format that can store it
+            alpha = i % 3 == 2
+            if alpha and ext in (".jpg", ".bmp"):
+                ext = ".png"
+            y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+            channels = [
+                127 + 100 * np.sin(x / (19.0 + i)) * np.cos(y / 29.0),
+                127 + 100 * np.sin((x + y) / 71.0),
+                rng.integers(0, 256, (height, width)).astype(np.float32),
+            ]
+            if alpha:
+                channels.append(255 - 100 * (x / width))
+            data = np.stack(channels, axis=-1).clip(0, 255).astype(np.uint8)
+            img = Image.fromarray(data)
+            name = f"img_{i:04d}{ext}"
+            img.save(os.path.join(hq_dir, name))
+            img.resize((width // 4, height // 4), Image.Resampling.BICUBIC).save(
+                os.path.join(lq_dir, name)
+            )
+        with open(os.path.join(build_dir, "corpus.json"), "w") as f:
+            json.dump(spec, f)
+
+        # Only an old corpus of ours (checked above) or an empty directory is here
+        if existing is not None:
+            shutil.rmtree(corpus_dir)
+        elif os.path.isdir(corpus_dir):
+            os.rmdir(corpus_dir)
+        os.rename(build_dir, corpus_dir)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    return spec
+
+
+def _timed_single(job):
+    image_path, output_dir, options = job
+    start = time.perf_counter()
+    resize_single_image(image_path, output_dir, verbose=False, **options)
+    return time.perf_counter() - start
+
+
+def _timed_pair(job):
+    start = time.perf_counter()
+    process_pair(job)
+    return time.perf_counter() - start
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def run_scenario(corpus_dir, scenario, workers, options):
+    """Runs one scenario in this process and returns its measurements."""
+    output_dir = tempfile.mkdtemp(prefix="bench_resize_out_")
+    hq_dir = os.path.join(corpus_dir, "hq")
+    names = sorted(os.listdir(hq_dir))
+    if scenario == "single":
+        worker = _timed_single
+        jobs = [(os.path.join(hq_dir, n), output_dir, options) for n in names]
+    else:
+        worker = _timed_pair
+        os.makedirs(os.path.join(output_dir, "hq"))
+        os.makedirs(os.path.join(output_dir, "lq"))
+        params = {
+            "max_width": options["max_width"],
+            "max_height": options["max_height"],
+            "tiled": options["tiled"],
+            "backend": options["backend"],
+            "profile": options["profile"],
+        }
+        jobs = [
+            (
+                os.path.join(hq_dir, n),
+                os.path.join(corpus_dir, "lq", n),
+                os.path.join(output_dir, "hq"),
+                os.path.join(output_dir, "lq"),
+                params,
+                "copy",
+                None,
+            )
+            for n in names
+        ]
+
+    try:
+        start = time.perf_counter()
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                latencies = list(executor.map(worker, jobs))
+        else:
+            latencies = [worker(job) for job in jobs]
+        wall = time.perf_counter() - start
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    peak_rss = peak_rss_mb()
+    return {
+        "scenario": scenario,
+        "workers": workers,
+        "images": len(jobs),
+        "wall_s": round(wall, 4),
+        "throughput_images_per_s": round(len(jobs) / wall, 3),
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "peak_rss_mb": None if peak_rss is None else round(peak_rss, 1),
+    }
+
+
+def peak_rss_mb():
+    """
+    Peak RSS of this process and of the largest worker, in MB, or None where the
+    resource module is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(peak_self, peak_children) / scale
+
+
+def git_commit():
+    """Commit the benchmark ran against, so results files can be compared."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark resize_single/resize_pair on a synthetic corpus and emit JSON."
+    )
+    parser.add_argument("--count", type=int, default=40, help="Images in the corpus.")
+    parser.add_argument(
+        "--corpus-dir",
+        default=os.path.join(tempfile.gettempdir(), "resize_bench_corpus"),
+        help="Where the corpus is generated (reused if it already matches).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, os.cpu_count() or 1],
+        help="Worker counts to run each scenario with (default: 1 and all cores).",
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", default=["single", "pair"], choices=["single", "pair"]
+    )
+    parser.add_argument("--backend", default="pillow")
+    parser.add_argument("--profile", default=None)
+    parser.add_argument("--draft", action="store_true")
+    parser.add_argument("--tiled", action="store_true")
+    parser.add_argument("--output", help="Write the JSON results to this file.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    options = {
+        "max_width": 1920,
+        "max_height": 1080,
+        "draft": args.draft,
+        "tiled": args.tiled,
+        "backend": args.backend,
+        "profile": args.profile,
+    }
+
+    if args.child == "corpus":
+        try:
+            print(json.dumps(make_corpus(args.corpus_dir, args.count)))
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+        return
+    if args.child:
+        scenario, workers = args.child.split(":")
+        result = run_scenario(args.corpus_dir, scenario, int(workers), options)
+        print(json.dumps(result))
+        return
+
+    # Generating the corpus is memory hungry, and Linux carries peak RSS across
+    # fork/exec, so it runs in a child to keep the parent small
+    corpus = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "corpus"]
+        + ["--corpus-dir", args.corpus_dir, "--count", str(args.count)],
+        capture_output=True,
+        text=True,
+    )
+    if corpus.returncode != 0:
+        sys.exit(
+            corpus.stderr.strip() or f"Corpus generation failed ({corpus.returncode})"
+        )
+    spec = json.loads(corpus.stdout)
+    results = []
+    for scenario in args.scenarios:
+        for workers in sorted(set(args.workers)):
+            # Each scenario runs in a fresh process so peak RSS is its own
+            command = [sys.executable, os.path.abspath(__file__)]
+            command += ["--child", f"{scenario}:{workers}"]
+            command += ["--corpus-dir", args.corpus_dir, "--backend", args.backend]
+            command += ["--profile", args.profile] if args.profile else []
+            command += ["--draft"] * args.draft + ["--tiled"] * args.tiled
+            output = subprocess.run(
+                command, capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            peak = result["peak_rss_mb"]
+            print(
+                f"{scenario:<7} workers={workers:<3} "
+                f"{result['throughput_images_per_s']:>8.2f} img/s  "
+                f"p50 {result['latency_p50_ms']:>8.1f} ms  "
+                f"p95 {result['latency_p95_ms']:>8.1f} ms  "
+                f"peak {'n/a' if peak is None else f'{peak:.1f}':>7} MB",
+                file=sys.stderr,
+            )
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "corpus": spec,
+        "options": options,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import os
+import sys
+import argparse
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from resize_utils import resize_tiled
+
+
+def make_synthetic_image(path, width, height):
+    """Writes a deterministic image, built in bands so generating it stays cheap."""
+    img = Image.new("RGB", (width, height))
+    rng = np.random.default_rng(0)
+    band = 512
+    for top in range(0, height, band):
+        rows = min(band, height - top)
+        y, x = np.mgrid[top : top + rows, 0:width].astype(np.float32)
+        r = 127 + 100 * np.sin(x / 37.0) * np.cos(y / 53.0)
+        g = 127 + 100 * np.sin((x + y) / 91.0)
+        b = rng.integers(0, 256, (rows, width), dtype=np.uint8)
+        data = np.stack([r, g, b], axis=-1).clip(0, 255).astype(np.uint8)
+        img.paste(Image.fromarray(data), (0, top))
+    img.save(path)
+
+
+def _premultiplied(img):
+    """
+    The premultiplied values an RGBA resize produced before Pillow divided them by
+    alpha. That division truncates (255 * p // a), so p = ceil(colour * a / 255).
+    """
+    data = np.asarray(img, dtype=np.int32)
+    alpha = data[..., 3:]
+    colour = -((-data[..., :3] * alpha) // 255)
+    return np.concatenate([colour, alpha], axis=-1)
+
+
+def check_matches_whole(work_dir, size=(1531, 1097), target=(317, 229)):
+    """
+    Resizes small BMP, TIFF and PNG sources in L, RGB, RGBA and P mode both whole
+    and tiled (several bands, streamed where the format allows) and raises
+    AssertionError if any output pixel differs by more than 1. Returns the largest
+    difference seen.
+
+    RGBA is compared on the premultiplied values Pillow actually resamples (see
+    _premultiplied): dividing by alpha afterwards stretches a 1-step difference
+    in those to up to 255 / alpha steps of straight colour.
+    """
+    rng = np.random.default_rng(1)
+    y, x = np.mgrid[0 : size[1], 0 : size[0]].astype(np.float32)
+    rgba = np.stack(
+        [
+            127 + 100 * np.sin(x / 17.0) * np.cos(y / 23.0),
+            127 + 100 * np.sin((x + y) / 41.0),
+            rng.integers(0, 256, (size[1], size[0])),
+            255 - 200 * (x / size[0]),
+        ],
+        axis=-1,
+    )
+    base = Image.fromarray(rgba.clip(0, 255).astype(np.uint8), "RGBA")
+    worst = 0
+    for mode in ("L", "RGB", "RGBA", "P"):
+        img = base.convert(mode) if mode != "P" else base.convert("RGB").quantize()
+        for ext in ("bmp", "tif", "png"):
+            path = os.path.join(work_dir, f"check_{mode}.{ext}")
+            img.save(path)
+            with Image.open(path) as src:
+                whole = src.resize(target, Image.Resampling.LANCZOS)
+            with Image.open(path) as src:
+                tiled = resize_tiled(src, target, band_rows=37)
+            if whole.mode == "P":
+                whole, tiled = whole.convert("RGB"), tiled.convert("RGB")
+            if whole.mode == "RGBA":
+                diff = np.abs(_premultiplied(whole) - _premultiplied(tiled)).max()
+            else:
+                diff = np.abs(
+                    np.asarray(whole, dtype=np.int16)
+                    - np.asarray(tiled, dtype=np.int16)
+                ).max()
+            diff = int(diff)
+            assert diff <= 1, f"tiled {mode} .{ext} differs from whole by {diff}"
+            worst = max(worst, diff)
+    return worst
+
+
+def run_child(mode, input_path, output_path, size, max_memory_mb):
+    """
+    Resizes once in this process and prints its peak RSS in MB ("n/a" where it
+    can't be measured, "nan" if the resize doesn't fit the ceiling).
+    """
+    img = Image.open(input_path)
+    if mode == "whole":
+        resized = img.resize(size, Image.Resampling.LANCZOS)
+    else:
+        try:
+            resized = resize_tiled(img, size, max_memory_mb=max_memory_mb)
+        except MemoryError:
+            # Compressed sources are decoded whole and may not fit the ceiling
+            print("nan")
+            return
+    resized.save(output_path)
+    try:
+        import resource
+    except ImportError:
+        # No resource module on Windows: report the difference without a peak
+        print("n/a")
+        return
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare whole-image and tiled LANCZOS resizing: peak RSS and pixel difference."
+    )
+    parser.add_argument("--size", type=int, default=12000, help="Source width/height.")
+    parser.add_argument("--target", type=int, default=1080, help="Target width/height.")
+    parser.add_argument("--max-memory", type=int, default=64, help="Ceiling in MB.")
+    parser.add_argument(
+        "--check-only",
+        action="store_true",
+        help="Only check that tiled output matches the whole-image resize.",
+    )
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    size = (args.target, args.target)
+
+    if args.child:
+        mode, input_path, output_path = args.child
+        if mode == "generate":
+            make_synthetic_image(output_path, args.size, args.size)
+        else:
+            run_child(mode, input_path, output_path, size, args.max_memory)
+        return
+
+    def child(mode, input_path, output_path):
+        # A fresh process per step: Linux carries peak RSS across fork/exec, so
+        # the parent must stay small for the children's numbers to mean anything
+        return subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--child",
+                mode,
+                input_path,
+                output_path,
+                "--size",
+                str(args.size),
+                "--target",
+                str(args.target),
+                "--max-memory",
+                str(args.max_memory),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_tiled_")
+    try:
+        worst = check_matches_whole(work_dir)
+        print(
+            f"Tiled matches whole-image resize (BMP/TIFF/PNG, L/RGB/RGBA/P): max diff {worst}"
+        )
+        if args.check_only:
+            return
+
+        print(f"Generating {args.size}x{args.size} sources...")
+        sources = []
+        for ext in ("tif", "png"):
+            path = os.path.join(work_dir, f"source.{ext}")
+            child("generate", "-", path)
+            sources.append(path)
+
+        print(f"{'source':<10}{'mode':<8}{'peak RSS (MB)':>15}{'max diff':>14}")
+        for source in sources:
+            outputs = {}
+            for mode in ("whole", "tiled"):
+                outputs[mode] = os.path.join(work_dir, f"{mode}.png")
+                peak = child(mode, source, outputs[mode])
+                diff = ""
+                if peak == "nan":
+                    diff = "over ceiling"
+                elif mode == "tiled":
+                    whole = np.asarray(Image.open(outputs["whole"]), dtype=np.int16)
+                    tiled = np.asarray(Image.open(outputs["tiled"]), dtype=np.int16)
+                    diff = int(np.abs(whole - tiled).max())
+                    assert diff <= 1, f"tiled {source} differs from whole by {diff}"
+                ext = os.path.splitext(source)[1]
+                if peak not in ("nan", "n/a"):
+                    peak = f"{float(peak):.1f}"
+                print(f"{ext:<10}{mode:<8}{peak:>15}{diff:>14}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
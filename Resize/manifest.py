@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+
+# Default manifest file name, written inside the output directory
+manifest_name = ".resize_manifest.jsonl"
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Records which inputs have already been processed, so reruns only handle new or
+    changed files.
+
+    The manifest is a JSON Lines file with one entry per processed input (or pair):
+    source paths with their size, mtime and optional hash, the resize parameters and
+    the output paths. Entries are appended and flushed as each file finishes, so an
+    interrupted run resumes where it stopped. On open the file is compacted to the
+    latest entry per source.
+    """
+
+    def __init__(self, path, use_hash=False):
+        self.path = path
+        self.use_hash = use_hash
+        self.entries = {}
+        self._load()
+        self._compact()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry["sources"][0]["path"]] = entry
+                except (ValueError, KeyError, IndexError, TypeError):
+                    # A crash mid-write can leave a truncated last line
+                    continue
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _fingerprint(self, path, with_hash):
+        stat = os.stat(path)
+        fingerprint = {
+            "path": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if with_hash:
+            fingerprint["hash"] = file_hash(path)
+        return fingerprint
+
+    def _source_unchanged(self, recorded, path):
+        stat = os.stat(path)
+        if stat.st_size != recorded["size"]:
+            return False
+        if stat.st_mtime_ns == recorded["mtime_ns"]:
+            return True
+        # Touched but possibly identical: only a content hash can tell
+        return self.use_hash and recorded.get("hash") == file_hash(path)
+
+    def is_current(self, source_paths, params):
+        """
+        True if source_paths were processed with the same params, none of them changed
+        since, and all recorded outputs still exist.
+        """
+        entry = self.entries.get(os.path.abspath(source_paths[0]))
+        if entry is None or entry["params"] != params:
+            return False
+        if len(entry["sources"]) != len(source_paths):
+            return False
+        try:
+            for recorded, path in zip(entry["sources"], source_paths):
+                if recorded["path"] != os.path.abspath(path):
+                    return False
+                if not self._source_unchanged(recorded, path):
+                    return False
+        except OSError:
+            return False
+        return all(os.path.exists(p) for p in entry["outputs"])
+
+    def record(self, source_paths, params, output_paths):
+        """Appends an entry for a finished input and flushes it to disk."""
+        entry = {
+            "sources": [self._fingerprint(p, self.use_hash) for p in source_paths],
+            "params": params,
+            "outputs": [os.path.abspath(p) for p in output_paths],
+        }
+        self.entries[entry["sources"][0]["path"]] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
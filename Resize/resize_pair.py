@@ -1,6 +1,17 @@
 import os
 from PIL import Image
-import shutil  # Import the shutil module for copying files
+
+from backends import backend_names, get_backend
+from manifest import Manifest, manifest_name
+from resize_utils import (
+    fast_copy,
+    image_extensions,
+    imap_bounded,
+    probe_image_size,
+    resize_tiled,
+    output_profiles,
+    save_image,
+)
 
 
 def resize_image_pair(
@@ -10,11 +21,26 @@ def resize_image_pair(
     output_lq_dir,
     max_width=1920,
     max_height=1080,
+    link_mode="copy",
+    tiled=False,
+    max_memory_mb=None,
+    backend="pillow",
+    profile=None,
 ):
     """
     Resizes a pair of HQ and LQ images if the HQ image exceeds the maximum dimensions,
     maintaining the aspect ratio and the 4x scale relationship. Copies the pair
-    to the output directory if no resizing is needed.
+    to the output directory if no resizing is needed (see fast_copy for link_mode).
+
+    With tiled=True, images are resized in horizontal bands (see resize_tiled) and
+    the HQ source is released before the LQ image is decoded, so only one large
+    image is held at a time.
+
+    backend names the resampling library used for the non-tiled resize (see
+    backends.get_backend). profile selects encoder settings from output_profiles;
+    None keeps the original quality=95 save.
+
+    Returns the (hq_output_path, lq_output_path) written, or None on error.
     """
     try:
         hq_img = Image.open(hq_image_path)
@@ -44,12 +70,21 @@ def resize_image_pair(
             new_lq_height = new_hq_height // 4
 
             # Resize images
-            hq_img_resized = hq_img.resize(
-                (new_hq_width, new_hq_height), Image.Resampling.LANCZOS
-            )
-            lq_img_resized = lq_img.resize(
-                (new_lq_width, new_lq_height), Image.Resampling.LANCZOS
-            )  # Resize LQ based on the *new* HQ size
+            if tiled:
+                hq_img_resized = resize_tiled(
+                    hq_img, (new_hq_width, new_hq_height), max_memory_mb=max_memory_mb
+                )
+                hq_img.close()
+                lq_img_resized = resize_tiled(
+                    lq_img, (new_lq_width, new_lq_height), max_memory_mb=max_memory_mb
+                )
+                lq_img.close()
+            else:
+                resampler = get_backend(backend)
+                hq_img_resized = resampler.resize(hq_img, (new_hq_width, new_hq_height))
+                lq_img_resized = resampler.resize(
+                    lq_img, (new_lq_width, new_lq_height)
+                )  # Resize LQ based on the *new* HQ size
 
             # Save resized images
             hq_output_path = os.path.join(
@@ -60,12 +95,8 @@ def resize_image_pair(
             )
 
             try:
-                hq_img_resized.save(
-                    hq_output_path, quality=95
-                )  # Added quality for JPEGs
-                lq_img_resized.save(
-                    lq_output_path, quality=95
-                )  # Added quality for JPEGs
+                save_image(hq_img_resized, hq_output_path, profile)
+                save_image(lq_img_resized, lq_output_path, profile)
             except IOError:
                 # If saving with original format fails, try PNG
                 print(
@@ -79,12 +110,13 @@ def resize_image_pair(
                     output_lq_dir,
                     os.path.splitext(os.path.basename(lq_image_path))[0] + ".png",
                 )
-                hq_img_resized.save(hq_output_path, format="PNG")
-                lq_img_resized.save(lq_output_path, format="PNG")
+                save_image(hq_img_resized, hq_output_path, profile, format="PNG")
+                save_image(lq_img_resized, lq_output_path, profile, format="PNG")
 
             print(
                 f"Saved resized images: {os.path.basename(hq_output_path)}, {os.path.basename(lq_output_path)}"
             )
+            return hq_output_path, lq_output_path
         else:
             print(
                 f"Image pair does not require resizing based on HQ dimensions: {os.path.basename(hq_image_path)}. Copying originals."
@@ -97,11 +129,12 @@ def resize_image_pair(
                 lq_output_path = os.path.join(
                     output_lq_dir, os.path.basename(lq_image_path)
                 )
-                shutil.copy(hq_image_path, hq_output_path)
-                shutil.copy(lq_image_path, lq_output_path)
+                fast_copy(hq_image_path, hq_output_path, link_mode)
+                fast_copy(lq_image_path, lq_output_path, link_mode)
                 print(
                     f"Copied original images: {os.path.basename(hq_image_path)}, {os.path.basename(lq_image_path)}"
                 )
+                return hq_output_path, lq_output_path
             except Exception as copy_e:
                 print(
                     f"Error copying files {os.path.basename(hq_image_path)} and {os.path.basename(lq_image_path)}: {copy_e}"
@@ -117,45 +150,304 @@ def resize_image_pair(
         )
 
 
+def copy_pair(
+    hq_image_path, lq_image_path, output_hq_dir, output_lq_dir, link_mode="copy"
+):
+    """
+    Copies a pair whose HQ image the header probe found to be within the max
+    dimensions, without decoding either image. Returns the output paths, or None.
+    """
+    try:
+        hq_output_path = os.path.join(output_hq_dir, os.path.basename(hq_image_path))
+        lq_output_path = os.path.join(output_lq_dir, os.path.basename(lq_image_path))
+        fast_copy(hq_image_path, hq_output_path, link_mode)
+        fast_copy(lq_image_path, lq_output_path, link_mode)
+        print(
+            f"Copied original images: {os.path.basename(hq_image_path)}, {os.path.basename(lq_image_path)}"
+        )
+        return hq_output_path, lq_output_path
+    except Exception as copy_e:
+        print(
+            f"Error copying files {os.path.basename(hq_image_path)} and {os.path.basename(lq_image_path)}: {copy_e}"
+        )
+
+
+def build_stem_index(directory, suffixes=(), extensions=image_extensions):
+    """
+    Scans directory once and maps each image's match key to (name, path).
+
+    The key is the file stem with the first matching suffix removed, so with
+    suffixes=("_x4",) both "img_x4.png" and "img.jpg" map to "img". Returns
+    (index, duplicates) where duplicates lists names whose key was already taken.
+    """
+    index = {}
+    duplicates = []
+    with os.scandir(directory) as entries:
+        files = sorted(
+            (entry.name, entry.path)
+            for entry in entries
+            if entry.name.lower().endswith(extensions) and entry.is_file()
+        )
+    for name, path in files:
+        stem = os.path.splitext(name)[0]
+        for suffix in suffixes:
+            if suffix and stem.endswith(suffix):
+                stem = stem[: -len(suffix)]
+                break
+        if stem in index:
+            duplicates.append(name)
+        else:
+            index[stem] = (name, path)
+    return index, duplicates
+
+
+def match_pairs(
+    hq_dir, lq_dir, hq_suffixes=(), lq_suffixes=(), extensions=image_extensions
+):
+    """
+    Matches HQ and LQ images by stem with one directory scan each, instead of one
+    os.path.exists call per file.
+
+    Returns (pairs, unmatched_hq, unmatched_lq, duplicates) where pairs is a sorted
+    list of (hq_path, lq_path) and the other three are lists of file names.
+    """
+    hq_index, hq_duplicates = build_stem_index(hq_dir, hq_suffixes, extensions)
+    lq_index, lq_duplicates = build_stem_index(lq_dir, lq_suffixes, extensions)
+    pairs = [
+        (hq_index[stem][1], lq_index[stem][1])
+        for stem in sorted(hq_index)
+        if stem in lq_index
+    ]
+    unmatched_hq = [hq_index[stem][0] for stem in sorted(hq_index.keys() - lq_index)]
+    unmatched_lq = [lq_index[stem][0] for stem in sorted(lq_index.keys() - hq_index)]
+    return pairs, unmatched_hq, unmatched_lq, hq_duplicates + lq_duplicates
+
+
+def report_names(message, names, limit=20):
+    """Prints a bulk report of file names, truncated to limit entries."""
+    if not names:
+        return
+    shown = ", ".join(names[:limit])
+    more = f" (+{len(names) - limit} more)" if len(names) > limit else ""
+    print(f"{message} ({len(names)}): {shown}{more}")
+
+
+def process_pair(job):
+    """
+    Worker entry point: reads the HQ header and either copies or resizes the pair.
+    Returns (sources, outputs, log); output is captured so the parent can print it
+    in order.
+    """
+    import io
+    from contextlib import redirect_stdout
+
+    (
+        hq_image_path,
+        lq_image_path,
+        output_hq_dir,
+        output_lq_dir,
+        params,
+        link,
+        max_memory_mb,
+    ) = job
+    sources = [hq_image_path, lq_image_path]
+    log = io.StringIO()
+    with redirect_stdout(log):
+        try:
+            hq_width, hq_height = probe_image_size(hq_image_path)
+        except Exception as e:
+            print(f"Skipping HQ image {os.path.basename(hq_image_path)}: {e}")
+            return sources, None, log.getvalue()
+        if hq_width > params["max_width"] or hq_height > params["max_height"]:
+            outputs = resize_image_pair(
+                hq_image_path,
+                lq_image_path,
+                output_hq_dir,
+                output_lq_dir,
+                params["max_width"],
+                params["max_height"],
+                link,
+                params["tiled"],
+                max_memory_mb,
+                params["backend"],
+                params["profile"],
+            )
+        else:
+            outputs = copy_pair(
+                hq_image_path, lq_image_path, output_hq_dir, output_lq_dir, link
+            )
+    return sources, outputs, log.getvalue()
+
+
 # --- Configuration ---
 # *** IMPORTANT: Replace these paths with your actual directory paths ***
 hq_input_dir = "./og/hq"
 lq_input_dir = "./og/lq"
 output_hq_dir = "./new/hq"
 output_lq_dir = "./new/lq"
-
-# Create output directories if they don't exist
-os.makedirs(output_hq_dir, exist_ok=True)
-os.makedirs(output_lq_dir, exist_ok=True)
+workers = 1  # Number of worker processes; 1 keeps the original serial behaviour
+link_mode = "copy"  # How unchanged pairs are copied: copy, hardlink or reflink
+use_manifest = True  # Skip pairs already processed with the same settings on reruns
 
 # --- Main processing loop ---
 if __name__ == "__main__":
-    # Get list of image files, assuming common image extensions
-    image_extensions = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tiff")
-    hq_images = sorted(
-        [
-            f
-            for f in os.listdir(hq_input_dir)
-            if f.lower().endswith(image_extensions)
-            and os.path.isfile(os.path.join(hq_input_dir, f))
-        ]
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Resize HQ/LQ image pairs so the HQ image fits within a maximum size."
+    )
+    parser.add_argument("--hq-dir", default=hq_input_dir, help="HQ input directory.")
+    parser.add_argument("--lq-dir", default=lq_input_dir, help="LQ input directory.")
+    parser.add_argument("--output-hq-dir", default=output_hq_dir)
+    parser.add_argument("--output-lq-dir", default=output_lq_dir)
+    parser.add_argument("--max-width", type=int, default=1920)
+    parser.add_argument("--max-height", type=int, default=1080)
+    parser.add_argument(
+        "--hq-suffix",
+        action="append",
+        default=[],
+        help="Suffix stripped from HQ stems before matching (repeatable).",
+    )
+    parser.add_argument(
+        "--lq-suffix",
+        action="append",
+        default=[],
+        help="Suffix stripped from LQ stems before matching, e.g. _x4 (repeatable).",
+    )
+    parser.add_argument(
+        "--extensions",
+        nargs="+",
+        default=list(image_extensions),
+        help="Image extensions to match (default: common image formats).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=workers,
+        help="Number of worker processes (default: 1, serial).",
+    )
+    parser.add_argument(
+        "--tiled",
+        action="store_true",
+        help="Resize in horizontal bands to keep memory bounded on very large images.",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=None,
+        help="Per-image memory ceiling in MB for the tiled resize (implies --tiled).",
     )
+    parser.add_argument(
+        "--backend",
+        choices=("auto",) + backend_names,
+        default="pillow",
+        help="Resampling library; 'auto' picks the fastest installed (default: pillow).",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=sorted(output_profiles),
+        default=None,
+        help="Encoder settings for resized output (default: original quality=95 save).",
+    )
+    parser.add_argument(
+        "--link",
+        choices=["copy", "hardlink", "reflink"],
+        default=link_mode,
+        help="How pairs that need no resizing are copied (default: copy).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocess every pair, ignoring the manifest from previous runs.",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        dest="use_manifest",
+        action="store_false",
+        default=use_manifest,
+        help="Do not read or write the manifest in the HQ output directory.",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Also record content hashes, so touched-but-identical inputs are skipped.",
+    )
+    args = parser.parse_args()
 
-    # Assuming image file names correspond between HQ and LQ (e.g., 'image1.png' in HQ and 'image1.png' in LQ)
-    # We will iterate through HQ images and find the corresponding LQ
-    print(f"Found {len(hq_images)} potential HQ images to process.")
+    # Create output directories if they don't exist
+    os.makedirs(args.output_hq_dir, exist_ok=True)
+    os.makedirs(args.output_lq_dir, exist_ok=True)
+
+    # One directory scan per side; LQ and HQ are matched by stem after stripping the
+    # configured suffixes, so e.g. 'img_x4.png' in LQ pairs with 'img.jpg' in HQ
+    extensions = tuple(ext.lower() for ext in args.extensions)
+    pairs, unmatched_hq, unmatched_lq, duplicates = match_pairs(
+        args.hq_dir, args.lq_dir, args.hq_suffix, args.lq_suffix, extensions
+    )
+    print(f"Found {len(pairs)} matched HQ/LQ pairs to process.")
+    report_names("HQ images without a matching LQ image", unmatched_hq)
+    report_names("LQ images without a matching HQ image", unmatched_lq)
+    report_names("Ignored images with a duplicate stem", duplicates)
 
-    for hq_img_name in hq_images:
-        lq_img_name = hq_img_name  # Assuming LQ image has the same name as HQ
-        lq_image_path = os.path.join(lq_input_dir, lq_img_name)
-        hq_image_path = os.path.join(hq_input_dir, hq_img_name)
+    # The manifest lives next to the HQ outputs and records each finished pair
+    params = {
+        "max_width": args.max_width,
+        "max_height": args.max_height,
+        "tiled": args.tiled or args.max_memory is not None,
+        "backend": args.backend,
+        "profile": args.profile,
+    }
+    manifest = None
+    if args.use_manifest:
+        manifest = Manifest(os.path.join(args.output_hq_dir, manifest_name), args.hash)
 
-        # Check if the corresponding LQ file exists before processing the pair
-        if os.path.exists(lq_image_path):
-            resize_image_pair(
-                hq_image_path, lq_image_path, output_hq_dir, output_lq_dir
+    def pending_jobs():
+        """Streams jobs for pairs that still need work straight to the workers."""
+        for hq_image_path, lq_image_path in pairs:
+            if (
+                manifest is not None
+                and not args.force
+                and manifest.is_current([hq_image_path, lq_image_path], params)
+            ):
+                continue
+            yield (
+                hq_image_path,
+                lq_image_path,
+                args.output_hq_dir,
+                args.output_lq_dir,
+                params,
+                args.link,
+                args.max_memory,
             )
+
+    executor = None
+    if args.workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+        results = imap_bounded(executor, process_pair, pending_jobs(), args.workers * 4)
+    else:
+        results = map(process_pair, pending_jobs())
+
+    # Results arrive in order, so each finished pair is logged and recorded in the
+    # manifest as soon as it (and everything before it) is done
+    processed = 0
+    failed = []
+    for sources, outputs, log in results:
+        processed += 1
+        print(log, end="")
+        if outputs:
+            if manifest is not None:
+                manifest.record(sources, params, outputs)
         else:
-            print(
-                f"Skipping HQ image {hq_img_name}: Corresponding LQ image not found at {lq_image_path}"
-            )
+            failed.append(os.path.basename(sources[0]))
+    if executor is not None:
+        executor.shutdown()
+
+    if manifest is not None:
+        manifest.close()
+    print(
+        f"Done. Processed {processed} pairs, {len(pairs) - processed} unchanged since "
+        f"the last run were skipped."
+    )
+    report_names("Pairs that failed", failed)
@@ -1,6 +1,15 @@
 import os
 from PIL import Image
-import shutil  # Import the shutil module for copying files
+
+from backends import backend_names, get_backend
+from manifest import Manifest, manifest_name
+from resize_utils import (
+    fast_copy,
+    output_profiles,
+    probe_directory,
+    resize_tiled,
+    save_image,
+)
 
 
 def resize_single_image(
@@ -8,18 +17,84 @@ def resize_single_image(
     output_dir,
     max_width=1920,
     max_height=1080,
+    verbose=True,
+    draft=False,
+    draft_tolerance=2.0,
+    link_mode="copy",
+    tiled=False,
+    max_memory_mb=None,
+    backend="pillow",
+    profile=None,
+    encoder=None,
+    targets=None,
+    pyramid_ratio=2.0,
 ):
     """
     Resizes a single image if it exceeds the maximum dimensions, maintaining the aspect ratio.
     Copies the image to the output directory if no resizing is needed.
+
+    With draft=True, JPEG sources are decoded at a reduced DCT scale that still leaves
+    at least draft_tolerance times the target size before the final LANCZOS pass.
+    Higher tolerances trade speed for output closer to the full-decode path.
+
+    With tiled=True the image is resized in horizontal bands (see resize_tiled) to
+    keep memory bounded, optionally within a max_memory_mb ceiling.
+
+    backend names the resampling library used for the non-tiled resize (see
+    backends.get_backend); the default "pillow" keeps the original output.
+
+    profile names an entry of output_profiles (fast / balanced / smallest) for the
+    encoder settings; None keeps the original quality=95 save. If encoder (a thread
+    pool) is given, saving is submitted to it and the result carries a "pending"
+    future - pass it to finish_result once the caller is ready to wait. This lets
+    the next image decode while the previous one encodes.
+
+    link_mode is passed to fast_copy for images that need no resizing.
+
+    targets is an optional list of target specs (see parse_target), e.g.
+    ["1920x1080", "1280x720", "1/4"]. The image is then decoded once and every
+    target is written to its own subdirectory of output_dir in the same pass;
+    max_width/max_height, tiled and encoder are not used. Smaller targets are
+    resized from the previous, larger one when it is at least pyramid_ratio times
+    the target size, otherwise from the source. The result's "outputs" lists every
+    path written.
+
+    Returns a result dict (name, status, output_path, bytes_in, bytes_out, error) so
+    callers running many images - e.g. in a process pool - can report on them.
     """
+    # Only print from here when running serially; worker processes report through
+    # the returned dict so the parent can print progress in order.
+    log = print if verbose else (lambda *args, **kwargs: None)
+    result = {
+        "name": os.path.basename(image_path),
+        "status": "error",
+        "output_path": None,
+        "bytes_in": 0,
+        "bytes_out": 0,
+        "error": None,
+    }
+    if targets:
+        return _resize_targets(
+            image_path,
+            output_dir,
+            targets,
+            result,
+            log,
+            draft,
+            draft_tolerance,
+            link_mode,
+            backend,
+            profile,
+            pyramid_ratio,
+        )
     try:
+        result["bytes_in"] = os.path.getsize(image_path)
         img = Image.open(image_path)
         width, height = img.size
 
         # Condition for resizing: image exceeds the target resolution
         if width > max_width or height > max_height:
-            print(f"Resizing image: {os.path.basename(image_path)}")
+            log(f"Resizing image: {os.path.basename(image_path)}")
 
             # Calculate the scaling factor
             width_scale = max_width / width
@@ -30,67 +105,521 @@ def resize_single_image(
             new_width = int(width * scale)
             new_height = int(height * scale)
 
+            # Let the JPEG decoder downscale during decode; target dimensions are
+            # still computed from the original size so output size is unchanged
+            if draft and img.format == "JPEG":
+                img.draft(
+                    img.mode,
+                    (
+                        int(new_width * draft_tolerance),
+                        int(new_height * draft_tolerance),
+                    ),
+                )
+
             # Resize image
-            img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            if tiled:
+                img_resized = resize_tiled(
+                    img, (new_width, new_height), max_memory_mb=max_memory_mb
+                )
+            else:
+                img_resized = get_backend(backend).resize(img, (new_width, new_height))
 
             # Save resized image
-            output_path = os.path.join(output_dir, os.path.basename(image_path))
-
-            try:
-                img_resized.save(output_path, quality=95)  # Added quality for JPEGs
-            except IOError:
-                # If saving with original format fails, try PNG
-                print(
-                    f"Could not save {os.path.basename(image_path)} in original format. Saving as PNG."
+            result["status"] = "resized"
+            if encoder is not None:
+                result["pending"] = encoder.submit(
+                    _save_resized, img_resized, image_path, output_dir, profile, log
                 )
-                output_path = os.path.join(
-                    output_dir,
-                    os.path.splitext(os.path.basename(image_path))[0] + ".png",
-                )
-                img_resized.save(output_path, format="PNG")
-
-            print(f"Saved resized image: {os.path.basename(output_path)}")
+                return result
+            result["output_path"] = _save_resized(
+                img_resized, image_path, output_dir, profile, log
+            )
         else:
-            print(
+            log(
                 f"Image does not require resizing: {os.path.basename(image_path)}. Copying original."
             )
             # Copy the original file if no resizing is needed
             try:
                 output_path = os.path.join(output_dir, os.path.basename(image_path))
-                shutil.copy(image_path, output_path)
-                print(f"Copied original image: {os.path.basename(image_path)}")
+                fast_copy(image_path, output_path, link_mode)
+                result["status"] = "copied"
+                result["output_path"] = output_path
+                log(f"Copied original image: {os.path.basename(image_path)}")
             except Exception as copy_e:
-                print(f"Error copying file {os.path.basename(image_path)}: {copy_e}")
+                result["error"] = f"Error copying file: {copy_e}"
+                log(f"Error copying file {os.path.basename(image_path)}: {copy_e}")
+
+    except FileNotFoundError:
+        result["error"] = "Image file not found"
+        log(f"Error: Image file not found: {os.path.basename(image_path)}")
+    except Exception as e:
+        result["error"] = f"Error processing image: {e}"
+        log(f"Error processing image {os.path.basename(image_path)}: {e}")
+
+    if result["output_path"] and os.path.exists(result["output_path"]):
+        result["bytes_out"] = os.path.getsize(result["output_path"])
+    return result
+
+
+def parse_target(spec):
+    """
+    Parses a target spec: "WxH" fits the image within W x H (like max_width and
+    max_height), "1/N" scales it down by N. Returns (name, kind, values) where name
+    is the output subdirectory.
+    """
+    if spec.startswith("1/"):
+        factor = int(spec[2:])
+        return f"div{factor}", "scale", factor
+    width, height = spec.lower().split("x")
+    return f"{int(width)}x{int(height)}", "fit", (int(width), int(height))
 
+
+def target_size(size, target):
+    """New (width, height) for a parsed target, or None if no resize is needed."""
+    width, height = size
+    _name, kind, values = target
+    if kind == "scale":
+        # Never below one pixel: 1/N of an image narrower than N would be 0 wide
+        return max(1, width // values), max(1, height // values)
+    max_width, max_height = values
+    if width <= max_width and height <= max_height:
+        return None
+    scale = min(max_width / width, max_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _resize_targets(
+    image_path,
+    output_dir,
+    targets,
+    result,
+    log,
+    draft,
+    draft_tolerance,
+    link_mode,
+    backend,
+    profile,
+    pyramid_ratio,
+):
+    """Decodes image_path once and writes every target. See resize_single_image."""
+    name = os.path.basename(image_path)
+    result["outputs"] = []
+    try:
+        result["bytes_in"] = os.path.getsize(image_path)
+        img = Image.open(image_path)
+        parsed = [parse_target(spec) for spec in targets]
+        sizes = [target_size(img.size, target) for target in parsed]
+        needed = [size for size in sizes if size is not None]
+
+        # Decode at reduced size only as far as the largest target allows
+        if draft and needed and img.format == "JPEG":
+            largest = max(needed, key=lambda size: size[0] * size[1])
+            img.draft(
+                img.mode,
+                (int(largest[0] * draft_tolerance), int(largest[1] * draft_tolerance)),
+            )
+
+        resampler = get_backend(backend)
+        # Largest targets first, so each can serve as the source of the next
+        levels = []
+        order = sorted(
+            range(len(parsed)),
+            key=lambda i: -(sizes[i][0] * sizes[i][1]) if sizes[i] else 0,
+        )
+        for i in order:
+            target_name, _kind, _values = parsed[i]
+            target_dir = os.path.join(output_dir, target_name)
+            os.makedirs(target_dir, exist_ok=True)
+            if sizes[i] is None:
+                log(f"{name} fits within {target_name}. Copying original.")
+                output_path = os.path.join(target_dir, name)
+                fast_copy(image_path, output_path, link_mode)
+            else:
+                new_width, new_height = sizes[i]
+                source = img
+                for level in levels:
+                    if (
+                        level.width >= new_width * pyramid_ratio
+                        and level.height >= new_height * pyramid_ratio
+                    ):
+                        source = level  # levels are largest first; keep the smallest
+                log(
+                    f"Resizing image: {name} -> {target_name} ({new_width}x{new_height})"
+                )
+                img_resized = resampler.resize(source, (new_width, new_height))
+                levels.append(img_resized)
+                output_path = _save_resized(
+                    img_resized, image_path, target_dir, profile, log
+                )
+            result["outputs"].append(output_path)
+            result["bytes_out"] += os.path.getsize(output_path)
+        result["status"] = "resized"
+        result["output_path"] = result["outputs"][0] if result["outputs"] else None
     except FileNotFoundError:
-        print(f"Error: Image file not found: {os.path.basename(image_path)}")
+        result["error"] = "Image file not found"
+        log(f"Error: Image file not found: {name}")
     except Exception as e:
-        print(f"Error processing image {os.path.basename(image_path)}: {e}")
+        result["error"] = f"Error processing image: {e}"
+        log(f"Error processing image {name}: {e}")
+    return result
+
+
+def _save_resized(img_resized, image_path, output_dir, profile, log):
+    """Saves a resized image, falling back to PNG. Returns the path written."""
+    output_path = os.path.join(output_dir, os.path.basename(image_path))
+
+    try:
+        save_image(img_resized, output_path, profile)
+    except IOError:
+        # If saving with original format fails, try PNG
+        log(
+            f"Could not save {os.path.basename(image_path)} in original format. Saving as PNG."
+        )
+        output_path = os.path.join(
+            output_dir,
+            os.path.splitext(os.path.basename(image_path))[0] + ".png",
+        )
+        save_image(img_resized, output_path, profile, format="PNG")
+
+    log(f"Saved resized image: {os.path.basename(output_path)}")
+    return output_path
+
+
+def finish_result(result):
+    """
+    Waits for a result's pending background save, if any, and fills in its output
+    path and size (or the error). Returns the result.
+    """
+    pending = result.pop("pending", None)
+    if pending is None:
+        return result
+    try:
+        result["output_path"] = pending.result()
+        result["bytes_out"] = os.path.getsize(result["output_path"])
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"Error saving image: {e}"
+    return result
 
 
 # --- Configuration ---
 # *** IMPORTANT: Replace these paths with your actual directory paths ***
-input_dir = "./og/single"  # Assuming you want to process images from the 'og/hq' directory
+input_dir = (
+    "./og/single"  # Assuming you want to process images from the 'og/hq' directory
+)
 output_dir = "./new/resized_single"  # New output directory
+workers = 1  # Number of worker processes; 1 keeps the original serial behaviour
+draft = False  # Reduced-size JPEG decoding, see resize_single_image
+draft_tolerance = 2.0
+link_mode = "copy"  # How unchanged images are copied: copy, hardlink or reflink
+use_manifest = True  # Skip inputs already processed with the same settings on reruns
+
+
+def _resize_worker(job):
+    """Process pool entry point: unpacks a job tuple and resizes quietly."""
+    image_path, output_dir, options = job
+    return resize_single_image(image_path, output_dir, verbose=False, **options)
+
+
+def copy_planned(
+    plan_entries, output_dir, link_mode="copy", manifest=None, params=None
+):
+    """
+    Copies images the header probe found to be within the max dimensions straight to
+    output_dir, without opening them with the decoder. Returns per-file results.
+    Successful copies are recorded in manifest, if given.
+    """
+    results = []
+    for name, path, _size in plan_entries:
+        output_path = os.path.join(output_dir, name)
+        result = {
+            "name": name,
+            "status": "copied",
+            "output_path": output_path,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "error": None,
+        }
+        try:
+            result["bytes_in"] = os.path.getsize(path)
+            fast_copy(path, output_path, link_mode)
+            result["bytes_out"] = os.path.getsize(output_path)
+            if manifest is not None:
+                manifest.record([path], params, [output_path])
+        except Exception as e:
+            result["status"] = "error"
+            result["output_path"] = None
+            result["error"] = f"Error copying file: {e}"
+        results.append(result)
+    return results
+
+
+def run_parallel(
+    image_paths, output_dir, options, workers=1, manifest=None, params=None
+):
+    """
+    Resizes images in a process pool and returns the list of per-file results.
+    options are keyword arguments for resize_single_image. Progress is printed in
+    input order, whatever order the workers finish in. Finished images are recorded
+    in manifest, if given, as their results arrive.
+    """
+    # Imported here so the serial path stays exactly as it was
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = [(path, output_dir, options) for path in image_paths]
+    # Hand out small batches so IPC overhead stays low on huge folders
+    chunksize = max(1, min(64, len(jobs) // (workers * 4) or 1))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for i, (job, result) in enumerate(
+            zip(jobs, executor.map(_resize_worker, jobs, chunksize=chunksize)), start=1
+        ):
+            if manifest is not None and not result["error"]:
+                manifest.record(
+                    [job[0]], params, result.get("outputs", [result["output_path"]])
+                )
+            if result["error"]:
+                print(f"[{i}/{len(jobs)}] {result['name']}: {result['error']}")
+            else:
+                print(f"[{i}/{len(jobs)}] {result['name']}: {result['status']}")
+            results.append(result)
+    return results
+
+
+def print_summary(results, elapsed):
+    """Prints counts, throughput, bytes in/out and any per-file errors."""
+    resized = sum(1 for r in results if r["status"] == "resized")
+    copied = sum(1 for r in results if r["status"] == "copied")
+    unchanged = sum(1 for r in results if r["status"] == "unchanged")
+    skipped = [r for r in results if r["status"] == "skipped"]
+    errors = [r for r in results if r["status"] == "error"]
+    bytes_in = sum(r["bytes_in"] for r in results)
+    bytes_out = sum(r["bytes_out"] for r in results)
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+
+    print("\n--- Summary ---")
+    print(f"Processed {len(results)} images in {elapsed:.2f}s ({rate:.1f} images/sec)")
+    print(
+        f"Resized: {resized}, Copied: {copied}, Unchanged: {unchanged}, "
+        f"Skipped: {len(skipped)}, Errors: {len(errors)}"
+    )
+    print(f"Bytes in: {bytes_in / 1e6:.1f} MB, Bytes out: {bytes_out / 1e6:.1f} MB")
+    if skipped:
+        print("Skipped:")
+        for r in skipped:
+            print(f"  {r['name']}: {r['error']}")
+    if errors:
+        print("Errors:")
+        for r in errors:
+            print(f"  {r['name']}: {r['error']}")
 
-# Create output directory if it doesn't exist
-os.makedirs(output_dir, exist_ok=True)
 
 # --- Main processing loop ---
 if __name__ == "__main__":
-    # Get list of image files, assuming common image extensions
-    image_extensions = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tiff")
-    images = sorted(
-        [
-            f
-            for f in os.listdir(input_dir)
-            if f.lower().endswith(image_extensions)
-            and os.path.isfile(os.path.join(input_dir, f))
-        ]
-    )
-
-    print(f"Found {len(images)} potential images to process.")
-
-    for img_name in images:
-        image_path = os.path.join(input_dir, img_name)
-        resize_single_image(image_path, output_dir)
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Resize images to fit within a maximum width and height."
+    )
+    parser.add_argument("--input-dir", default=input_dir, help="Input directory.")
+    parser.add_argument("--output-dir", default=output_dir, help="Output directory.")
+    parser.add_argument("--max-width", type=int, default=1920)
+    parser.add_argument("--max-height", type=int, default=1080)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=workers,
+        help="Number of worker processes (default: 1, serial).",
+    )
+    parser.add_argument(
+        "--draft",
+        action="store_true",
+        default=draft,
+        help="Use reduced-size decoding for JPEG sources (faster, slightly lower quality).",
+    )
+    parser.add_argument(
+        "--draft-tolerance",
+        type=float,
+        default=draft_tolerance,
+        help="Minimum decoded size as a multiple of the target size (default: 2.0).",
+    )
+    parser.add_argument(
+        "--tiled",
+        action="store_true",
+        help="Resize in horizontal bands to keep memory bounded on very large images.",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=None,
+        help="Per-image memory ceiling in MB for the tiled resize (implies --tiled).",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("auto",) + backend_names,
+        default="pillow",
+        help="Resampling library; 'auto' picks the fastest installed (default: pillow).",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=sorted(output_profiles),
+        default=None,
+        help="Encoder settings for resized output (default: original quality=95 save).",
+    )
+    parser.add_argument(
+        "--encode-threads",
+        type=int,
+        default=0,
+        help="Save in N background threads so encoding overlaps the next decode "
+        "(serial mode only; default: 0).",
+    )
+    parser.add_argument(
+        "--target",
+        action="append",
+        default=None,
+        help="Output size spec, repeatable: WxH to fit within, or 1/N to scale down. "
+        "Each image is decoded once and written to one subdirectory per target.",
+    )
+    parser.add_argument(
+        "--link",
+        choices=["copy", "hardlink", "reflink"],
+        default=link_mode,
+        help="How images that need no resizing are copied (default: copy).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocess every image, ignoring the manifest from previous runs.",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        dest="use_manifest",
+        action="store_false",
+        default=use_manifest,
+        help="Do not read or write the manifest in the output directory.",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Also record content hashes, so touched-but-identical inputs are skipped.",
+    )
+    args = parser.parse_args()
+
+    # Create output directory if it doesn't exist
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+
+    # Read only the image headers first, so images that are already small enough
+    # are copied without ever being decoded
+    plan = probe_directory(args.input_dir, args.max_width, args.max_height)
+    total = len(plan["resize"]) + len(plan["copy"]) + len(plan["skip"])
+    print(
+        f"Found {total} potential images: {len(plan['resize'])} to resize, "
+        f"{len(plan['copy'])} to copy, {len(plan['skip'])} to skip."
+    )
+
+    results = [
+        {
+            "name": name,
+            "status": "skipped",
+            "output_path": None,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "error": reason,
+        }
+        for name, _path, reason in plan["skip"]
+    ]
+
+    options = {
+        "max_width": args.max_width,
+        "max_height": args.max_height,
+        "draft": args.draft,
+        "draft_tolerance": args.draft_tolerance,
+        "tiled": args.tiled or args.max_memory is not None,
+        "max_memory_mb": args.max_memory,
+        "link_mode": args.link,
+        "backend": args.backend,
+        "profile": args.profile,
+        "targets": args.target,
+    }
+    # The memory ceiling and the copy method don't change the output, so they
+    # aren't part of the key deciding whether an image needs redoing
+    params = {
+        k: v for k, v in options.items() if k not in ("max_memory_mb", "link_mode")
+    }
+
+    # Drop inputs a previous (possibly interrupted) run already finished
+    manifest = None
+    if args.use_manifest:
+        manifest = Manifest(os.path.join(args.output_dir, manifest_name), args.hash)
+        if not args.force:
+            for action in ("copy", "resize"):
+                pending = []
+                for name, path, size in plan[action]:
+                    if manifest.is_current([path], params):
+                        results.append(
+                            {
+                                "name": name,
+                                "status": "unchanged",
+                                "output_path": None,
+                                "bytes_in": 0,
+                                "bytes_out": 0,
+                                "error": None,
+                            }
+                        )
+                    else:
+                        pending.append((name, path, size))
+                plan[action] = pending
+            print(
+                f"{len(results) - len(plan['skip'])} images unchanged since the last run."
+            )
+
+    if args.target:
+        # Every target decides for itself whether to resize or copy
+        plan["resize"] = sorted(plan["resize"] + plan["copy"])
+        plan["copy"] = []
+    results += copy_planned(plan["copy"], args.output_dir, args.link, manifest, params)
+
+    image_paths = [path for _name, path, _size in plan["resize"]]
+    if args.workers > 1:
+        results += run_parallel(
+            image_paths, args.output_dir, options, args.workers, manifest, params
+        )
+    else:
+        from collections import deque
+
+        encoder = None
+        if args.encode_threads > 0:
+            from concurrent.futures import ThreadPoolExecutor
+
+            encoder = ThreadPoolExecutor(max_workers=args.encode_threads)
+        # Saves in flight; capped so resized images don't pile up in memory
+        in_flight = deque()
+
+        def finish_oldest():
+            image_path, result = in_flight.popleft()
+            result = finish_result(result)
+            if manifest is not None and not result["error"]:
+                manifest.record(
+                    [image_path],
+                    params,
+                    result.get("outputs", [result["output_path"]]),
+                )
+            results.append(result)
+
+        for image_path in image_paths:
+            result = resize_single_image(
+                image_path, args.output_dir, encoder=encoder, **options
+            )
+            in_flight.append((image_path, result))
+            if len(in_flight) > args.encode_threads:
+                finish_oldest()
+        while in_flight:
+            finish_oldest()
+        if encoder is not None:
+            encoder.shutdown()
+    if manifest is not None:
+        manifest.close()
+    print_summary(results, time.perf_counter() - start)
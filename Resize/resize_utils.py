@@ -0,0 +1,437 @@
+import os
+import shutil
+from PIL import Image
+
+# Common image extensions picked up by the Resize scripts
+image_extensions = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tiff")
+
+# Linux ioctl request for a copy-on-write clone (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def probe_image_size(image_path):
+    """
+    Returns (width, height) by reading only the image header. Pillow's open() is lazy,
+    so no pixel data is decoded here.
+    """
+    with Image.open(image_path) as img:
+        return img.size
+
+
+def probe_directory(input_dir, max_width=1920, max_height=1080):
+    """
+    Scans input_dir once and reads only the headers of the images in it.
+
+    Returns a plan dict with three sorted lists:
+        "resize": (name, path, (width, height)) for images above the max dimensions
+        "copy":   (name, path, (width, height)) for images already within them
+        "skip":   (name, path, reason) for files whose header could not be read
+    """
+    plan = {"resize": [], "copy": [], "skip": []}
+    with os.scandir(input_dir) as entries:
+        candidates = sorted(
+            (entry.name, entry.path)
+            for entry in entries
+            if entry.name.lower().endswith(image_extensions) and entry.is_file()
+        )
+
+    for name, path in candidates:
+        try:
+            width, height = probe_image_size(path)
+        except Exception as e:
+            plan["skip"].append((name, path, f"Could not read image header: {e}"))
+            continue
+        if width > max_width or height > max_height:
+            plan["resize"].append((name, path, (width, height)))
+        else:
+            plan["copy"].append((name, path, (width, height)))
+    return plan
+
+
+def _reflink(src, dst):
+    """Clones src to dst with the FICLONE ioctl. Raises OSError if unsupported."""
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+
+def _kernel_copy(src, dst):
+    """
+    Copies file contents inside the kernel with copy_file_range or sendfile, without
+    round-tripping the data through Python. Falls back to shutil.copyfile.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        remaining = size
+        try:
+            if hasattr(os, "copy_file_range"):
+                while remaining > 0:
+                    sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if sent == 0:
+                        break
+                    remaining -= sent
+            elif hasattr(os, "sendfile") and os.name != "nt":
+                offset = 0
+                while remaining > 0:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, remaining)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+            else:
+                shutil.copyfileobj(fsrc, fdst)
+                remaining = 0
+        except OSError:
+            # e.g. cross-filesystem copy_file_range on older kernels
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst)
+            remaining = 0
+        if remaining > 0:
+            # Source shrank or the kernel stopped early; finish in userspace from
+            # where it stopped (sendfile takes an explicit offset, so it never moves
+            # fsrc's position)
+            fsrc.seek(size - remaining)
+            fdst.seek(size - remaining)
+            shutil.copyfileobj(fsrc, fdst)
+
+
+def fast_copy(src, dst, link_mode="copy"):
+    """
+    Copies src to dst without decoding the image.
+
+    link_mode:
+        "copy"     - kernel-side copy (copy_file_range / sendfile)
+        "hardlink" - hard link dst to src, falling back to a copy across devices
+        "reflink"  - copy-on-write clone where the filesystem supports it, else a copy
+
+    Like shutil.copy, permission bits are copied for the "copy" and "reflink" modes.
+    If dst already is src (the same path, or a hard link to it from an earlier
+    run), there is nothing to copy and both are left untouched.
+    """
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            # Removing dst here would delete the source image
+            return
+        os.remove(dst)
+
+    if link_mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    elif link_mode == "reflink":
+        try:
+            _reflink(src, dst)
+            shutil.copymode(src, dst)
+            return
+        except (OSError, ImportError):
+            pass
+
+    _kernel_copy(src, dst)
+    shutil.copymode(src, dst)
+
+
+def imap_bounded(executor, fn, iterable, max_in_flight):
+    """
+    Like executor.map, but pulls from iterable lazily and keeps at most max_in_flight
+    tasks submitted at a time, so jobs can stream in from a generator. Results are
+    yielded in input order.
+    """
+    from collections import deque
+
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# Bytes per pixel of the raw layouts that can be decoded a band of rows at a time
+_raw_bytes_per_pixel = {
+    "L": 1,
+    "P": 1,
+    "LA": 2,
+    "RGB": 3,
+    "BGR": 3,
+    "RGBA": 4,
+    "RGBX": 4,
+    "BGRA": 4,
+    "BGRX": 4,
+    "XBGR": 4,
+    "ABGR": 4,
+    "CMYK": 4,
+    "I;16": 2,
+    "I;16B": 2,
+    "I;16L": 2,
+}
+
+
+def band_tiles(img, top, bottom):
+    """
+    Returns Pillow decoder tiles covering rows [top, bottom) of an uncompressed
+    image (e.g. BMP, PPM, uncompressed TIFF), shifted so the band starts at row 0.
+    Returns None if the image's layout can't be decoded in bands.
+    """
+    tiles = []
+    for tile in img.tile:
+        codec, (x0, y0, x1, y1), offset, args = tile[:4]
+        if codec != "raw":
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode = args[0]
+        stride = args[1] if len(args) > 1 else 0
+        orientation = args[2] if len(args) > 2 else 1
+        if rawmode not in _raw_bytes_per_pixel or orientation not in (1, -1):
+            return None
+        if stride <= 0:
+            stride = (x1 - x0) * _raw_bytes_per_pixel[rawmode]
+
+        band_y0, band_y1 = max(y0, top), min(y1, bottom)
+        if band_y0 >= band_y1:
+            continue
+        if orientation == 1:
+            band_offset = offset + (band_y0 - y0) * stride
+        else:
+            # Bottom-up rows: the band's last row is stored first
+            band_offset = offset + (y1 - band_y1) * stride
+        tiles.append(
+            (
+                "raw",
+                (x0, band_y0 - top, x1, band_y1 - top),
+                band_offset,
+                (rawmode, stride, orientation),
+            )
+        )
+    return tiles
+
+
+def _can_restrict_rows(img):
+    """True if img still has the Pillow internals restrict_to_rows rewrites."""
+    return hasattr(img, "_size") and isinstance(getattr(img, "tile", None), list)
+
+
+def restrict_to_rows(img, top, bottom):
+    """
+    Points a freshly opened (not yet loaded) uncompressed image at rows [top, bottom)
+    only, so load() decodes just that band as an image bottom - top rows high.
+    Returns False, leaving img untouched, if its layout can't be decoded in bands.
+
+    This is version sensitive: it rewrites Pillow's private ImageFile attributes
+    (_size, TIFF's _tile_size, and the tile list), which have no public API. If a
+    Pillow release drops them, it returns False and callers decode the whole image.
+    """
+    if not _can_restrict_rows(img):
+        return False
+    tiles = band_tiles(img, top, bottom)
+    if not tiles:
+        return False
+    img._size = (img.width, bottom - top)
+    if hasattr(img, "_tile_size"):
+        # TIFF allocates its buffer from this rather than from size
+        img._tile_size = img._size
+    img.tile = tiles
+    return True
+
+
+def _open_band(image_path, top, bottom):
+    """
+    Decodes only rows [top, bottom) of an uncompressed image. Falls back to decoding
+    the whole image and cropping if the rows can't be restricted.
+    """
+    img = Image.open(image_path)
+    if not restrict_to_rows(img, top, bottom):
+        img.load()
+        band = img.crop((0, top, img.width, bottom))
+        img.close()
+        return band
+    img.load()
+    if img.im.size != img.size:
+        band = img.crop((0, 0) + img.size)
+        img.close()
+        return band
+    return img
+
+
+def can_stream_bands(img):
+    """True if img's pixel data can be decoded a band of rows at a time."""
+    return (
+        bool(getattr(img, "filename", None))
+        and _can_restrict_rows(img)
+        and band_tiles(img, 0, 1) is not None
+    )
+
+
+def band_rows_for_memory(src_size, new_size, max_memory_mb, streamed):
+    """
+    Picks how many output rows to resize per band so the working buffers stay within
+    max_memory_mb. Returns None if even a single row would not fit - for sources that
+    can't be streamed, the fully decoded source counts against the ceiling.
+    """
+    src_width, src_height = src_size
+    new_width, new_height = new_size
+    scale_y = src_height / new_height
+    # Pillow stores 8-bit images with 4 bytes per pixel
+    budget = max_memory_mb * 1024 * 1024 - new_width * new_height * 4
+    if not streamed:
+        budget -= src_width * src_height * 4
+    # Source rows a band needs: its own rows plus the LANCZOS support on each side
+    margin_rows = 2 * (3 * max(scale_y, 1) + 2)
+    per_row = 4 * (src_width * scale_y + new_width * scale_y + new_width)
+    fixed = 4 * (src_width + new_width) * margin_rows
+    rows = int((budget - fixed) / per_row)
+    if rows < 1:
+        return None
+    return min(rows, new_height)
+
+
+def _nearest_rows(src_height, new_height):
+    """
+    Source row of each output row in a nearest-neighbour resize, computed the way
+    Pillow does (a running sum of the scale), so ties fall on the same rows.
+    """
+    scale = src_height / new_height
+    position = scale * 0.5
+    rows = []
+    for _ in range(new_height):
+        rows.append(min(int(position), src_height - 1))
+        position += scale
+    return rows
+
+
+def _pick_rows(source, rows, offset):
+    """An image made of the given rows of source (shifted up by offset), in order."""
+    picked = Image.new(source.mode, (source.width, len(rows)))
+    for i, row in enumerate(rows):
+        top = row - offset
+        picked.paste(source.crop((0, top, source.width, top + 1)), (0, i))
+    return picked
+
+
+def resize_tiled(
+    img, size, resample=Image.Resampling.LANCZOS, band_rows=256, max_memory_mb=None
+):
+    """
+    Resizes img to size one horizontal band of output rows at a time.
+
+    Each band is resized from the matching source rows plus the filter support on
+    either side, so the result matches a whole-image resize (up to rounding in the
+    last bit of the filter weights). Nearest-neighbour resizes (also what Pillow
+    uses for P and 1 images) take exactly the source rows a whole-image resize
+    would. Uncompressed sources are also decoded band by band, so only a band of
+    the source is ever in memory; other formats are decoded once and only the
+    resize buffers are bounded.
+
+    With max_memory_mb, band_rows is chosen to fit the ceiling instead, and a
+    MemoryError is raised if the image can't be resized within it.
+    """
+    new_width, new_height = size
+    src_width, src_height = img.size
+    scale_y = src_height / new_height
+    support = 3 * max(scale_y, 1)  # LANCZOS support in source rows
+    nearest = resample == Image.Resampling.NEAREST or img.mode in ("1", "P")
+    if nearest:
+        source_rows = _nearest_rows(src_height, new_height)
+    streamed = can_stream_bands(img)
+    if max_memory_mb:
+        band_rows = band_rows_for_memory(img.size, size, max_memory_mb, streamed)
+        if band_rows is None:
+            raise MemoryError(
+                f"{src_width}x{src_height} image can't be resized within the "
+                f"{max_memory_mb} MB memory ceiling"
+            )
+    if not streamed:
+        img.load()
+
+    # Like Image.resize, keep the palette and info (transparency, ICC profile...)
+    output = Image.new(img.mode, size)
+    if img.mode in ("P", "PA"):
+        output.putpalette(img.getpalette())
+    output.info = img.info.copy()
+    for out_top in range(0, new_height, band_rows):
+        out_bottom = min(out_top + band_rows, new_height)
+        box_top = out_top * scale_y
+        box_bottom = out_bottom * scale_y
+        if nearest:
+            src_top = source_rows[out_top]
+            src_bottom = source_rows[out_bottom - 1] + 1
+        else:
+            src_top = max(0, int(box_top - support) - 1)
+            src_bottom = min(src_height, int(box_bottom + support) + 2)
+        if streamed:
+            source = _open_band(img.filename, src_top, src_bottom)
+        else:
+            source = img
+            if not nearest:
+                src_top = 0
+        if nearest:
+            band = _pick_rows(
+                source, source_rows[out_top:out_bottom], src_top if streamed else 0
+            ).resize((new_width, out_bottom - out_top), Image.Resampling.NEAREST)
+        else:
+            band = source.resize(
+                (new_width, out_bottom - out_top),
+                resample,
+                box=(0, box_top - src_top, src_width, box_bottom - src_top),
+            )
+        output.paste(band, (0, out_top))
+        if streamed:
+            source.close()
+    return output
+
+
+# Named encoder settings for resized output, keyed by Pillow format name. JPEG
+# quality stays at the scripts' usual 95; the profiles only trade encode time for
+# file size.
+output_profiles = {
+    "fast": {
+        "PNG": {"compress_level": 1},
+        "JPEG": {"quality": 95, "subsampling": "4:2:0"},
+        "WEBP": {"quality": 95, "method": 0},
+    },
+    "balanced": {
+        "PNG": {"compress_level": 6},
+        "JPEG": {"quality": 95, "optimize": True, "subsampling": "4:2:0"},
+        "WEBP": {"quality": 95, "method": 4},
+    },
+    "smallest": {
+        "PNG": {"compress_level": 9, "optimize": True},
+        "JPEG": {
+            "quality": 95,
+            "optimize": True,
+            "progressive": True,
+            "subsampling": "4:2:0",
+        },
+        "WEBP": {"quality": 95, "method": 6},
+    },
+}
+
+
+def save_image(img, output_path, profile=None, format=None):
+    """
+    Saves img with the encoder settings of a named output profile.
+
+    Without a profile this is the scripts' original save: quality=95 (which only
+    JPEG/WebP use), or the plain default settings when format is given explicitly.
+    """
+    if profile is None:
+        if format:
+            img.save(output_path, format=format)
+        else:
+            img.save(output_path, quality=95)  # Added quality for JPEGs
+        return
+    if format is None:
+        ext = os.path.splitext(output_path)[1].lower()
+        format = Image.registered_extensions().get(ext)
+    img.save(output_path, format=format, **output_profiles[profile].get(format, {}))
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from resize_utils import fast_copy
+
+
+@pytest.mark.parametrize("link_mode", ["copy", "hardlink", "reflink"])
+def test_fast_copy_onto_itself_keeps_source(tmp_path, link_mode):
+    src = tmp_path / "image.png"
+    src.write_bytes(b"not really a png")
+    fast_copy(str(src), str(src), link_mode)
+    assert src.read_bytes() == b"not really a png"
+
+
+def test_fast_copy_onto_existing_hardlink_keeps_both(tmp_path):
+    src = tmp_path / "image.png"
+    dst = tmp_path / "out.png"
+    src.write_bytes(b"data")
+    os.link(src, dst)
+    fast_copy(str(src), str(dst))
+    assert src.read_bytes() == dst.read_bytes() == b"data"
+
+
+def test_fast_copy_replaces_other_file(tmp_path):
+    src = tmp_path / "image.png"
+    dst = tmp_path / "out.png"
+    src.write_bytes(b"new")
+    dst.write_bytes(b"old contents")
+    fast_copy(str(src), str(dst))
+    assert dst.read_bytes() == b"new"